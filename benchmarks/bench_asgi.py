@@ -0,0 +1,68 @@
+"""
+Concurrent-request throughput of the two serving modes with the same number of worker processes:
+    WSGI: gunicorn wsgi (sync Flask, --threads per worker)
+    ASGI: uvicorn asgi:application (async engine for the read endpoints)
+
+    $ python benchmarks/bench_asgi.py --concurrency 64 --workers 2
+    $ DATABASE_URL=postgresql://... python benchmarks/bench_asgi.py --no-seed    (already seeded with benchmarks/seed.py)
+
+Use Postgres for meaningful numbers, with SQLite every query is a local file read and there is little I/O to overlap.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+from run import SRC, GunicornDriver, UvicornDriver, summarize
+
+PATHS = ["/drink", "/orders?limit=50", "/user?limit=100", "/healthz"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per endpoint and mode")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    if not args.no_seed:
+        sys.path.insert(0, SRC)
+        from app import create_app
+        app = create_app()
+        from models import db
+        from seed import seed
+        with app.app_context():
+            db.create_all()
+            seed(orders=args.orders)
+
+    results = {"concurrency": args.concurrency, "workers": args.workers, "threads": args.threads, "results": {}}
+    for driver_class in (GunicornDriver, UvicornDriver):
+        driver = driver_class(args.workers, args.threads, dict(os.environ))
+        results["results"][driver.name] = {}
+        try:
+            for path in PATHS:
+                jobs = [lambda path=path: driver.request("GET", path, None, None, {})[:2] + (None,) for _ in range(args.requests)]
+                started = time.perf_counter()
+                samples = driver.run(jobs, args.concurrency)
+                summary = summarize(samples, time.perf_counter() - started)
+                results["results"][driver.name][path] = summary
+                print(f"{driver.name:<9} {path:<18} {summary['throughput_rps']:>8} req/s  p50 {summary['p50_ms']:>8} ms  "
+                      f"p95 {summary['p95_ms']:>8} ms  {summary['errors']} errors", flush=True)
+        finally:
+            driver.close()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Cold start of the API: import time of src/app.py (`python -X importtime`), time to build the app and serve its
+first request in a fresh process, wall time of a CLI command, and boot-to-first-request of gunicorn and uvicorn.
+
+    $ python benchmarks/bench_boot.py --runs 5 --output boot.json
+    $ python benchmarks/bench_boot.py --baseline boot.json    (exits with 1 if booting got slower)
+
+Every number is the median of --runs fresh processes.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+from run import SRC, GunicornDriver, UvicornDriver
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+FIRST_REQUEST = """
+import time
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+imported = time.perf_counter()
+status = app.test_client().get("/healthz").status_code
+print(imported - started, time.perf_counter() - started, status)
+"""
+
+def import_times(env):
+    # (total seconds, {module imported by app.py: cumulative seconds}) of one `python -X importtime -c "import app"`
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=SRC, env=env,
+                            capture_output=True, text=True, check=True)
+    children = {}
+    for line in result.stderr.splitlines(): #a module is listed after the modules it imports
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        cumulative, depth, name = int(match.group(2)) / 1e6, len(match.group(3)), match.group(4)
+        if depth == 2:
+            children[name] = cumulative
+        elif depth == 0:
+            if name == "app":
+                return cumulative, children
+            children = {}
+    raise RuntimeError("app was not imported")
+
+def first_request(env): #seconds to import + create_app(), and to the end of the first request
+    result = subprocess.run([sys.executable, "-c", FIRST_REQUEST], cwd=SRC, env=env, capture_output=True, text=True, check=True)
+    created, answered, status = result.stdout.split()
+    assert status == "200", status
+    return float(created), float(answered)
+
+def cli_command(env): #wall time of a CLI command that loads the app
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "routes"], cwd=SRC, env=env,
+                   capture_output=True, check=True)
+    return time.perf_counter() - started
+
+def server_boot(driver_class, env): #from starting the server process to its first 200 on /healthz
+    started = time.perf_counter()
+    driver = driver_class(1, 1, env)
+    elapsed = time.perf_counter() - started
+    driver.close()
+    return elapsed
+
+def median_ms(samples):
+    return round(statistics.median(samples) * 1000, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--no-servers", action="store_true", help="skip the gunicorn and uvicorn boots")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if "DATABASE_URL" not in env:
+        env["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "boot.db")
+
+    totals, modules = [], {}
+    for _ in range(args.runs):
+        total, imported = import_times(env)
+        totals.append(total)
+        for name, seconds in imported.items():
+            modules.setdefault(name, []).append(seconds)
+    firsts = [first_request(env) for _ in range(args.runs)]
+    results = {
+        "import_app_ms": median_ms(totals),
+        "create_app_ms": median_ms([created for created, _ in firsts]),
+        "first_request_ms": median_ms([answered for _, answered in firsts]),
+        "cli_command_ms": median_ms([cli_command(env) for _ in range(args.runs)]),
+        "slowest_imports_ms": dict(sorted(((name, median_ms(samples)) for name, samples in modules.items()),
+                                          key=lambda item: -item[1])[:args.top])
+    }
+    if not args.no_servers:
+        for driver_class in (GunicornDriver, UvicornDriver):
+            results[f"{driver_class.name}_boot_ms"] = median_ms([server_boot(driver_class, env) for _ in range(args.runs)])
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = [f"{key}: {baseline[key]} ms -> {value} ms" for key, value in results.items()
+                       if key.endswith("_ms") and key in baseline and value > baseline[key] * (1 + args.tolerance)]
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+        print("no regressions against", args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Throughput of the bulk drink import: upserts N generated rows into an empty SQLite database (inserts),
+then the same rows again with new prices (updates), and exports them back.
+
+    $ python benchmarks/bench_import.py --rows 100000
+    $ DATABASE_URL=postgresql://... python benchmarks/bench_import.py --rows 100000 --no-create
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+def make_csv(rows, price_offset=0):
+    buffer = io.StringIO()
+    buffer.write("name,price\n")
+    for i in range(rows):
+        buffer.write(f"drink {i},{(i % 500) / 100 + 1 + price_offset}\n")
+    buffer.seek(0)
+    return buffer
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--no-create", action="store_true", help="use the tables of an already migrated DATABASE_URL")
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    sys.path.insert(0, SRC)
+    from app import create_app
+    app = create_app()
+    from models import db, Drink
+    import bulk
+
+    batch_size = args.batch_size or bulk.BATCH_SIZE
+    results = {"rows": args.rows, "batch_size": batch_size}
+    with app.app_context():
+        if not args.no_create:
+            db.create_all()
+        for phase, offset in (("insert", 0), ("update", 1)):
+            started = time.perf_counter()
+            result = bulk.import_drinks(make_csv(args.rows, offset), "csv", batch_size=batch_size)
+            elapsed = time.perf_counter() - started
+            assert result["error_count"] == 0, result["errors"][:5]
+            results[phase] = {"seconds": round(elapsed, 3), "rows_per_second": round(args.rows / elapsed)}
+
+        started = time.perf_counter()
+        exported = sum(chunk.count("\n") for chunk in bulk.export_drinks("csv")) - 1
+        elapsed = time.perf_counter() - started
+        results["export"] = {"seconds": round(elapsed, 3), "rows_per_second": round(exported / elapsed)}
+        results["drinks_in_table"] = Drink.query.count()
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Overhead of the rate limiter (src/ratelimit.py): cost of one bucket check per backend, single thread and
+with concurrent threads, and the latency of POST /orders with the limiter enabled and disabled.
+
+    $ python benchmarks/bench_ratelimit.py --calls 100000 --threads 8
+    $ RATELIMIT_REDIS_URL=redis://localhost:6379/1 python benchmarks/bench_ratelimit.py    (adds a real redis)
+
+The fakeredis numbers have no network, with a real redis one check costs about one round-trip.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+from run import SRC, TestClientDriver, summarize
+
+def bench_backend(backend, calls, threads, clients=1000):
+    # every call is allowed (huge rate), the buckets of `clients` different keys are updated
+    def batch(offset):
+        for i in range(offset, calls, threads):
+            backend.take(f"bench:{i % clients}", 1e9, 1e9)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(batch, range(threads)))
+    elapsed = time.perf_counter() - started
+    return {"calls_per_second": round(calls / elapsed), "us_per_call": round(elapsed / calls * 1e6, 2)}
+
+def bench_endpoint(app, requests):
+    driver = TestClientDriver(app)
+    limiter = app.extensions["rate_limiter"]
+    limiter.rate = limiter.burst = 1e9 #measure the check, never reject
+    results = {}
+    for enabled in (False, True, False, True): #interleaved, the second round of each is kept (warm)
+        limiter.enabled = enabled
+        samples = []
+        started = time.perf_counter()
+        for i in range(requests):
+            samples.append(driver.request("POST", "/orders", {"name": f"bench {i}", "drinks": [1, 2]}, None, {})[:2] + (None,))
+        results["enabled" if enabled else "disabled"] = summarize(samples, time.perf_counter() - started)
+    results["p50_overhead_ms"] = round(results["enabled"]["p50_ms"] - results["disabled"]["p50_ms"], 3)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100000, help="bucket checks per backend and thread count")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000, help="POST /orders per round")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["JOB_WORKERS"] = "0"
+    sys.path.insert(0, SRC)
+    import ratelimit
+    from app import create_app
+    from models import db
+    from seed import seed
+
+    backends = {"memory": ratelimit.MemoryBackend()}
+    try:
+        import fakeredis
+        backends["fakeredis"] = ratelimit.RedisBackend(fakeredis.FakeRedis())
+    except ImportError:
+        print("fakeredis not installed, skipped")
+    if os.getenv("RATELIMIT_REDIS_URL"):
+        backends["redis"] = ratelimit.backend_from_env()
+
+    results = {"backends": {}}
+    for name, backend in backends.items():
+        calls = args.calls if name == "memory" else args.calls // 10
+        results["backends"][name] = {f"{threads} threads": bench_backend(backend, calls, threads) for threads in (1, args.threads)}
+        print(name, results["backends"][name], flush=True)
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed(users=10, drinks=10, orders=0)
+    results["post_orders"] = bench_endpoint(app, args.requests)
+    print(json.dumps(results["post_orders"], indent=2))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
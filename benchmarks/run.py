@@ -0,0 +1,297 @@
+"""
+API benchmark suite: seeds a database, drives every route of src/app.py through the Flask test client
+and/or a local gunicorn, and reports p50/p95/p99 latency, throughput and SQL statements per request.
+
+    $ python benchmarks/run.py --output bench.json
+    $ python benchmarks/run.py --mode gunicorn --concurrency 16 --workers 4
+    $ python benchmarks/run.py --baseline benchmarks/baseline.json    (exits with 1 on a regression, for CI)
+
+SQL statements are read from the Server-Timing header, the app runs with PROFILING_ENABLED=1.
+Without DATABASE_URL a temporary SQLite file is created and seeded, with DATABASE_URL the tables
+must already exist and be empty (`pipenv run upgrade` first).
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, "..", "src")
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+def scenarios(volumes):
+    # (name, method, path(i, state), body(i, state), content type), run in this order:
+    # drinks created by "create drink" are the ones updated and deleted afterwards
+    drinks = volumes["drinks"]
+
+    def created(i, state):
+        return state["created"][i % len(state["created"])] if state["created"] else 1
+
+    def deleted(i, state):
+        return state["created"].pop() if state["created"] else 0
+
+    return [
+        ("sitemap", "GET", lambda i, s: "/", None, None),
+        ("healthz", "GET", lambda i, s: "/healthz", None, None),
+        ("list users page", "GET", lambda i, s: "/user?limit=100", None, None),
+        ("list users stream", "GET", lambda i, s: "/user?stream=ndjson", None, None),
+        ("list drinks", "GET", lambda i, s: "/drink", None, None),
+        ("list drinks page", "GET", lambda i, s: f"/drink?limit=50&after={i % drinks}", None, None),
+        ("list drinks 304", "GET", lambda i, s: "/drink", None, "etag"),
+        ("drink cache stats", "GET", lambda i, s: "/drink/cache", None, None),
+        ("export drinks", "GET", lambda i, s: "/drink/export", None, None),
+        ("list orders", "GET", lambda i, s: "/orders", None, None),
+        ("list orders page", "GET", lambda i, s: f"/orders?limit=100&after={i * 100 % volumes['orders']}", None, None),
+        ("list orders 304", "GET", lambda i, s: "/orders?limit=100", None, "etag"),
+        ("analytics top drinks", "GET", lambda i, s: "/analytics/drinks?top=10", None, None),
+        ("analytics daily", "GET", lambda i, s: "/analytics/daily", None, None),
+        ("create order", "POST", lambda i, s: "/orders",
+         lambda i, s: {"name": f"bench {i}", "drinks": [i % drinks + 1, (i * 7) % drinks + 1, i % drinks + 1]}, None),
+        ("create drink", "POST", lambda i, s: "/drink", lambda i, s: {"name": f"bench drink {s['run']} {i}", "price": 2.5}, None),
+        ("update drink", "PUT", lambda i, s: f"/drink/{created(i, s)}", lambda i, s: {"price": 3 + i % 5}, None),
+        ("bulk import drinks", "POST", lambda i, s: "/drink/bulk",
+         lambda i, s: "".join(f'{{"name": "bulk {s["run"]} {i} {n}", "price": 1.5}}\n' for n in range(100)), "ndjson"),
+        ("delete drink", "DELETE", lambda i, s: f"/drink/{deleted(i, s)}", None, None),
+    ]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def summarize(samples, elapsed):
+    latencies = [sample[0] for sample in samples]
+    queries = [sample[2] for sample in samples if sample[2] is not None]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for sample in samples if sample[1] >= 400),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "throughput_rps": round(len(samples) / elapsed, 1),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None
+    }
+
+def queries_from(headers):
+    match = QUERIES_RE.search(headers.get("Server-Timing") or "")
+    return int(match.group(1)) if match else None
+
+class TestClientDriver: #in-process, one request at a time, measures the app without any network or server
+    name = "testclient"
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body, content_type, headers):
+        kwargs = {"headers": headers}
+        if content_type == "ndjson":
+            kwargs.update(data=body, content_type="application/x-ndjson")
+        elif body is not None:
+            kwargs["json"] = body
+        started = time.perf_counter()
+        response = self.client.open(path, method=method, **kwargs)
+        response.get_data() #consumes streamed bodies
+        elapsed = time.perf_counter() - started
+        return elapsed, response.status_code, dict(response.headers), response.get_json(silent=True)
+
+    def run(self, jobs, concurrency):
+        return [job() for job in jobs]
+
+    def close(self):
+        pass
+
+class GunicornDriver: #real HTTP against `gunicorn wsgi --chdir ./src/` like the Procfile, with concurrent clients
+    name = "gunicorn"
+
+    def __init__(self, workers, threads, env):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.process = subprocess.Popen(self.command(workers, threads), env=env)
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                if self.request("GET", "/healthz", None, None, {})[1] == 200:
+                    return
+            except OSError:
+                time.sleep(0.01) #short, bench_boot.py measures the time to the first answer
+        self.close()
+        raise RuntimeError(f"{self.name} did not start")
+
+    def command(self, workers, threads):
+        return [sys.executable, "-m", "gunicorn", "wsgi", "--chdir", SRC, "--bind", f"127.0.0.1:{self.port}",
+                "--workers", str(workers), "--threads", str(threads), "--log-level", "warning"]
+
+    def request(self, method, path, body, content_type, headers):
+        headers = dict(headers)
+        if content_type == "ndjson":
+            payload = body.encode()
+            headers["Content-Type"] = "application/x-ndjson"
+        elif body is not None:
+            payload = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        else:
+            payload = None
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        started = time.perf_counter()
+        connection.request(method, path, body=payload, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        elapsed = time.perf_counter() - started
+        connection.close()
+        try:
+            parsed = json.loads(data) if data else None
+        except ValueError:
+            parsed = None
+        return elapsed, response.status, dict(response.getheaders()), parsed
+
+    def run(self, jobs, concurrency):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(lambda job: job(), jobs))
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+class UvicornDriver(GunicornDriver): #the ASGI entry point (src/asgi.py), threads are not used
+    name = "uvicorn"
+
+    def command(self, workers, threads):
+        return [sys.executable, "-m", "uvicorn", "asgi:application", "--app-dir", SRC, "--host", "127.0.0.1",
+                "--port", str(self.port), "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+
+def run_scenarios(driver, volumes, requests, concurrency, only=None):
+    state = {"created": [], "run": driver.name}
+    results = {}
+    for name, method, path, body, special in scenarios(volumes):
+        if only and name not in only:
+            continue
+        headers = {}
+        if special == "etag": #conditional poll of an unchanged collection
+            etag = driver.request(method, path(0, state), None, None, {})[2].get("ETag")
+            headers = {"If-None-Match": etag} if etag else {}
+
+        def job(i, path=path, body=body, headers=headers, special=special, name=name, method=method):
+            payload = body(i, state) if body else None
+            elapsed, status, response_headers, parsed = driver.request(
+                method, path(i, state), payload, "ndjson" if special == "ndjson" else None, headers)
+            if name == "create drink" and isinstance(parsed, dict) and "id" in parsed:
+                state["created"].append(parsed["id"])
+            return elapsed, status, queries_from(response_headers)
+
+        count = requests
+        if name == "delete drink":
+            count = min(requests, len(state["created"]))
+        if count == 0:
+            continue
+        jobs = [lambda i=i: job(i) for i in range(count)]
+        started = time.perf_counter()
+        samples = driver.run(jobs, concurrency)
+        results[name] = summarize(samples, time.perf_counter() - started)
+        print(f"  {name:<22} p50 {results[name]['p50_ms']:>9} ms  p95 {results[name]['p95_ms']:>9} ms  "
+              f"{results[name]['throughput_rps']:>8} req/s  {results[name]['queries_per_request']} queries/req"
+              f"{'  ' + str(results[name]['errors']) + ' errors' if results[name]['errors'] else ''}", flush=True)
+    return results
+
+def compare(results, baseline, tolerance):
+    # latency/throughput may move tolerance*100 %, the number of SQL statements must not grow at all
+    regressions = []
+    for mode, scenarios_results in results["results"].items():
+        for name, current in scenarios_results.items():
+            previous = baseline.get("results", {}).get(mode, {}).get(name)
+            if previous is None:
+                continue
+            if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{mode} {name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+            if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+                regressions.append(f"{mode} {name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s")
+            if (current["queries_per_request"] or 0) > (previous["queries_per_request"] or 0):
+                regressions.append(f"{mode} {name}: queries/request {previous['queries_per_request']} -> {current['queries_per_request']}")
+            if current["errors"] > previous["errors"]:
+                regressions.append(f"{mode} {name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--drinks", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--mode", choices=["testclient", "gunicorn", "both"], default="testclient")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients in gunicorn mode")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--scenario", action="append", help="run only this scenario, can be repeated")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed latency/throughput change against the baseline")
+    args = parser.parse_args()
+
+    os.environ["PROFILING_ENABLED"] = "1"
+    os.environ.setdefault("QUERY_WARNING_THRESHOLD", "1000")
+    os.environ.setdefault("RATELIMIT_ENABLED", "0") #every request comes from the same address, bench_ratelimit.py measures the limiter
+    seeded = "DATABASE_URL" not in os.environ
+    if seeded:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    sys.path.insert(0, SRC)
+    sys.path.insert(0, HERE)
+    from app import create_app
+    app = create_app()
+    from models import db
+    from seed import seed
+
+    volumes = {"users": args.users, "drinks": args.drinks, "orders": args.orders}
+    with app.app_context():
+        if seeded:
+            db.create_all()
+        print("seeded", seed(**volumes), flush=True)
+
+    results = {
+        "meta": {
+            "volumes": volumes,
+            "requests_per_scenario": args.requests,
+            "concurrency": args.concurrency,
+            "database": app.config["SQLALCHEMY_DATABASE_URI"].split(":")[0],
+            "python": platform.python_version(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": {}
+    }
+    modes = ["testclient", "gunicorn"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        print(mode, flush=True)
+        if mode == "testclient":
+            driver = TestClientDriver(app)
+        else:
+            driver = GunicornDriver(args.workers, args.threads, dict(os.environ))
+        try:
+            results["results"][mode] = run_scenarios(driver, volumes, args.requests, args.concurrency, args.scenario)
+        finally:
+            driver.close()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+        print("no regressions against", args.baseline)
+
+if __name__ == "__main__":
+    main()
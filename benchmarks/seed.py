@@ -0,0 +1,70 @@
+"""
+Fills the database with a reproducible volume of users, drinks and orders for the benchmarks.
+
+    $ python benchmarks/seed.py --users 1000 --drinks 200 --orders 20000
+    $ DATABASE_URL=postgresql://... python benchmarks/seed.py --orders 100000 --no-create
+"""
+import argparse
+import os
+import random
+import sys
+from sqlalchemy import text
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+BATCH_SIZE = 5000
+
+def _insert(db, table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(table.insert(), rows[start:start + BATCH_SIZE])
+
+def seed(users=1000, drinks=200, orders=10000, max_items=5, random_seed=42):
+    # must run inside an app context, the tables must exist and be empty
+    from models import db, User, Drink, Order, OrderItem
+    rng = random.Random(random_seed)
+
+    _insert(db, User.__table__, [
+        {"id": i, "email": f"user{i}@example.com", "password": "benchmark", "is_active": True}
+        for i in range(1, users + 1)
+    ])
+    menu = [{"id": i, "name": f"drink {i}", "price": round(rng.uniform(1, 10), 2)} for i in range(1, drinks + 1)]
+    _insert(db, Drink.__table__, menu)
+
+    order_rows, item_rows = [], []
+    for order_id in range(1, orders + 1):
+        chosen = rng.sample(menu, rng.randint(1, min(max_items, drinks)))
+        total = 0
+        for drink in chosen:
+            quantity = rng.randint(1, 3)
+            total += quantity * drink["price"]
+            item_rows.append({"order_id": order_id, "drink_id": drink["id"], "drink_name": drink["name"],
+                              "quantity": quantity, "unit_price": drink["price"]})
+        order_rows.append({"id": order_id, "name": f"order {order_id}", "total": round(total, 2)})
+    _insert(db, Order.__table__, order_rows)
+    _insert(db, OrderItem.__table__, item_rows)
+    if db.session.get_bind().dialect.name == "postgresql": #explicit ids do not move the serial sequences
+        for table in ("user", "drink", "order"):
+            db.session.execute(text(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), (SELECT MAX(id) FROM \"{table}\"))"))
+    db.session.commit()
+    return {"users": users, "drinks": drinks, "orders": orders, "order_items": len(item_rows)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--drinks", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--max-items", type=int, default=5, help="different drinks per order")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-create", action="store_true", help="use the tables of an already migrated DATABASE_URL")
+    args = parser.parse_args()
+
+    sys.path.insert(0, SRC)
+    from app import create_app
+    app = create_app()
+    from models import db
+    with app.app_context():
+        if not args.no_create:
+            db.create_all()
+        print(seed(args.users, args.drinks, args.orders, args.max_items, args.seed))
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,112 @@
 import os #imports the operating system, which is used to interact with the operating system environment 
+from flask import g
 from flask_admin import Admin #extension that lets add admin interfaces to flask apps.  
+from sqlalchemy import and_, or_, text
 from models import db, User, Drink, Order # Imports the SQLAlchemy database instance (db) and database models. These models represent tables in the database.
+from flask_admin.contrib.sqla.filters import BaseSQLAFilter, FilterEqual
 from flask_admin.contrib.sqla import ModelView #modelview is a class provided by flask_admin specifically for SQLALchemty based models. Provides generic views that can be used to display and interact with SQLAlchemy model data in the FlaskAdmin interface.
 
+ADMIN_PAGE_SIZE = 50
+MAX_ADMIN_PAGE_SIZE = 100 #?page_size= is capped, flask-admin would otherwise accept any number
+ESTIMATED_COUNT_MIN_ROWS = 100000 #tables bigger than this show the planner's row estimate instead of a COUNT(*)
+
+def estimated_row_count(table): #row estimate from the database statistics, None when the database has none
+    bind = db.session.get_bind()
+    if bind.dialect.name == "postgresql":
+        estimate = db.session.execute(text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:name)"),
+                                      {"name": bind.dialect.identifier_preparer.format_table(table)}).scalar()
+    elif bind.dialect.name == "mysql":
+        estimate = db.session.execute(text("SELECT TABLE_ROWS FROM information_schema.TABLES "
+                                           "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name"),
+                                      {"name": table.name}).scalar()
+    else:
+        return None
+    # reltuples is -1 on Postgres until the table is vacuumed or analyzed
+    return int(estimate) if estimate is not None and estimate >= 0 else None
+
+def starts_with(column, prefix): #column LIKE 'prefix%' written as a range, which the B-tree index of the column serves (case sensitive)
+    return and_(column >= prefix, column < prefix + "\U0010ffff")
+
+class FilterStartsWith(BaseSQLAFilter): #flask-admin's string filters are LIKE '%value%', no index can serve them
+    def apply(self, query, value, alias=None):
+        return query.filter(starts_with(self.get_column(alias), value))
+
+    def operation(self):
+        return "starts with"
+
+class TunedModelView(ModelView): #bounded pages, no relationship columns in the list and no full COUNT(*) on big tables
+    page_size = ADMIN_PAGE_SIZE
+    can_set_page_size = True
+    column_display_pk = True
+    column_default_sort = ("id", True) #newest first, walks the primary key index
+
+    def _get_list_extra_args(self):
+        view_args = super()._get_list_extra_args()
+        if not 0 < view_args.page_size <= MAX_ADMIN_PAGE_SIZE:
+            view_args.page_size = 0 #the default page size
+        return view_args
+
+    def get_list(self, page, sort_column, sort_desc, search, filters, execute=True, page_size=None):
+        # without search or filters the pager total of a big table comes from the statistics, with them it is an
+        # exact count that can use the indexes of the searchable and filterable columns
+        estimate = None
+        if not search and not filters:
+            estimate = estimated_row_count(self.model.__table__)
+            if estimate is not None and estimate < ESTIMATED_COUNT_MIN_ROWS:
+                estimate = None
+        g.admin_estimated_count = estimate
+        count, query = super().get_list(page, sort_column, sort_desc, search, filters, execute=execute, page_size=page_size)
+        return (estimate if estimate is not None else count), query
+
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        # the search text is a prefix of one of the searchable columns (their indexes serve it), flask-admin's
+        # default is ILIKE '%word%' for every word, a full scan of the table for the list and again for the count
+        match = or_(*[starts_with(column, search.strip()) for column, path in self._search_fields])
+        query = query.filter(match)
+        if count_query is not None:
+            count_query = count_query.filter(match)
+        return query, count_query, joins, count_joins
+
+    def search_placeholder(self):
+        return f"{super().search_placeholder()} (starts with, case sensitive)"
+
+    def get_count_query(self):
+        if g.get("admin_estimated_count") is not None:
+            return None #flask-admin skips the COUNT(*) when there is no count query
+        return super().get_count_query()
+
+class UserView(TunedModelView):
+    column_list = ("id", "email", "is_active")
+    column_searchable_list = ("email",) #unique index
+    column_sortable_list = ("id", "email")
+    column_filters = (FilterEqual(User.email, "Email"), FilterStartsWith(User.email, "Email"))
+
+class DrinkView(TunedModelView):
+    column_list = ("id", "name", "price")
+    column_searchable_list = ("name",) #unique index
+    column_sortable_list = ("id", "name") #price is not indexed
+    column_filters = (FilterEqual(Drink.name, "Name"), FilterStartsWith(Drink.name, "Name"))
+
+class OrderView(TunedModelView):
+    # only the order columns, the items are not loaded for the list; the form does not list every order_item row
+    column_list = ("id", "name", "total", "created_at")
+    column_searchable_list = ("name",) #ix_order_name
+    column_sortable_list = ("id", "created_at") #indexed, sorting millions of orders by anything else is a full scan
+    column_filters = ("id", "created_at", FilterEqual(Order.name, "Name"), FilterStartsWith(Order.name, "Name")) #ix_order_created_at, ix_order_name
+    form_columns = ("name",)
+    can_create = False #orders are made through POST /orders, which fills the items, the total and the analytics
+    can_view_details = True
+    column_details_list = ("id", "name", "total", "created_at", "items")
+
 #defining the setup_admin function
-def setup_admin(app): #func that takes a Flask application instance (app) as an argument. It configures and sets up the Flask-Admin interface within the Flask application.
+def setup_admin(app, url='/admin'): #func that takes a Flask application instance (app) as an argument. It configures and sets up the Flask-Admin interface within the Flask application.
 #setting up the flask-admin 
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')#: Sets the Flask application's secret key. The secret key is used to securely sign session cookies and other security-related features in Flask.
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'#Sets the Flask-Admin interface theme to 'cerulean'. This controls the appearance of the admin interface.
-    admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')#Initializes the Flask-Admin extension with the Flask application instance (app).
+    admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3', url=url)#Initializes the Flask-Admin extension with the Flask application instance (app).
 
     
     # Add your models here, for example this is how we add a the User model to the admin
-    admin.add_view(ModelView(User, db.session))
-    admin.add_view(ModelView(Drink, db.session))
-    admin.add_view(ModelView(Order, db.session))
\ No newline at end of file
+    admin.add_view(UserView(User, db.session))
+    admin.add_view(DrinkView(Drink, db.session))
+    admin.add_view(OrderView(Order, db.session))
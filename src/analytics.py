@@ -0,0 +1,81 @@
+"""
+Sales analytics served from summary tables (drink_sales, daily_sales).
+record_order adds every new order to the totals, so reading them costs O(result) instead of O(orders); POST /orders
+runs it in the background as an order_analytics job. rebuild recomputes both tables from the orders (`flask rebuild-analytics`).
+"""
+from sqlalchemy import func, select
+from models import db, utcnow, Order, OrderItem, DrinkSales, DailySales, TableVersion
+from bulk import upsert_statement
+from jobs import handler
+
+MAX_TOP = 100
+REBUILD_MARKER = "analytics_rebuild" #table_version row, its version is the highest order id counted by the last rebuild
+
+def record_order(order): #call after flushing the new order and its items, in the same transaction as the job
+    if order.items: #an empty parameter list would insert one row of NULLs
+        db.session.execute(
+            upsert_statement(DrinkSales.__table__, ["drink_id"], ["drink_name"], ["quantity", "orders", "revenue"]),
+            [{"drink_id": item.drink_id, "drink_name": item.drink_name, "quantity": item.quantity, "orders": 1,
+              "revenue": item.quantity * item.unit_price} for item in order.items]
+        )
+    db.session.execute(
+        upsert_statement(DailySales.__table__, ["day"], increment_columns=["orders", "revenue"]),
+        [{"day": order.created_at.date(), "orders": 1, "revenue": order.total}]
+    )
+
+@handler("order_analytics")
+def record_order_job(order_id):
+    # the shared lock on the marker makes a rebuild wait for this job (and recount its order) or this job wait
+    # for the rebuild, and then skip an order the rebuild already counted
+    counted_through = db.session.execute(
+        select(TableVersion.version).where(TableVersion.name == REBUILD_MARKER).with_for_update(read=True)
+    ).scalar()
+    if counted_through is not None and order_id <= counted_through:
+        return
+    order = Order.query_with_items().filter(Order.id == order_id).one_or_none()
+    if order is not None: #deleted before the job ran
+        record_order(order)
+
+def rebuild(): #recomputes both summary tables from scratch in one transaction
+    # locks the marker first (running order_analytics jobs finish before), counts the orders up to the highest id
+    # and saves that id in the marker: the jobs of those orders still pending or waiting on the lock skip them
+    db.session.execute(
+        upsert_statement(TableVersion.__table__, ["name"], ["updated_at"]),
+        [{"name": REBUILD_MARKER, "version": 0, "updated_at": utcnow()}]
+    )
+    counted_through = db.session.query(func.max(Order.id)).scalar() or 0
+    db.session.execute(DrinkSales.__table__.delete())
+    db.session.execute(DailySales.__table__.delete())
+    # the most recent name of each drink comes from its line with the highest order id
+    latest_name = db.session.query(OrderItem.drink_name) \
+        .filter(OrderItem.drink_id == DrinkSales.__table__.c.drink_id, OrderItem.order_id <= counted_through) \
+        .order_by(OrderItem.order_id.desc()).limit(1).scalar_subquery()
+    db.session.execute(DrinkSales.__table__.insert().from_select(
+        ["drink_id", "drink_name", "quantity", "orders", "revenue"],
+        db.session.query(OrderItem.drink_id, func.max(OrderItem.drink_name), func.sum(OrderItem.quantity),
+                         func.count(), func.sum(OrderItem.quantity * OrderItem.unit_price))
+        .filter(OrderItem.order_id <= counted_through)
+        .group_by(OrderItem.drink_id).statement
+    ))
+    db.session.execute(DrinkSales.__table__.update().values(drink_name=latest_name))
+    day = func.date(Order.created_at)
+    db.session.execute(DailySales.__table__.insert().from_select(
+        ["day", "orders", "revenue"],
+        db.session.query(day, func.count(), func.sum(Order.total)).filter(Order.id <= counted_through).group_by(day).statement
+    ))
+    db.session.execute(TableVersion.__table__.update().where(TableVersion.name == REBUILD_MARKER)
+                       .values(version=counted_through))
+    db.session.commit()
+    return {"drinks": DrinkSales.query.count(), "days": DailySales.query.count()}
+
+def top_drinks(limit, by="revenue"):
+    column = DrinkSales.quantity if by == "quantity" else DrinkSales.revenue
+    return [row.serialize() for row in DrinkSales.query.order_by(column.desc(), DrinkSales.drink_id).limit(limit).all()]
+
+def daily_sales(start=None, end=None): #both dates included
+    query = DailySales.query
+    if start is not None:
+        query = query.filter(DailySales.day >= start)
+    if end is not None:
+        query = query.filter(DailySales.day <= end)
+    return [row.serialize() for row in query.order_by(DailySales.day).all()]
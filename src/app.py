@@ -1,26 +1,43 @@
 """
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
+create_app() builds the app, the endpoints are in routes.py. Only what every request needs is set up here,
+the admin is only loaded when ADMIN_ENABLED and the migrations only by the `flask db` commands.
 """
 import os #provides way to interact with operating system 
-from flask import Flask, request, jsonify #imports necessary info to build the web application in python 
-from flask_migrate import Migrate         #flask extension that handles database migrations for Flask applications using Alembic. Database operations are provided as command line under flash db command.
-from flask_swagger import swagger         #provides method that inspects the Flask app for endpoints that contain YAML docstrings. Used for creating API doc unsing swagger.
+import click
+from flask import Flask #imports necessary info to build the web application in python 
 from flask_cors import CORS               #extension for handling CORS. Allows us to control which origins are allowed to request, which HTTP methods are allowed, and what headers can be sent along with the requests.
-from utils import APIException, generate_sitemap  #generates an index of all the endpoints of the application. 
-from admin import setup_admin             
-from models import db, User, Drink, Order #db connection to sqlalchemy, could be changed for any other name.
-
-#Create Flask App
-app = Flask(__name__)                   #creates a flask application instance
-app.url_map.strict_slashes = False      #configures app to ignore trailing slashes in route URLs.
-
-#Configure database 
-db_url = os.getenv("DATABASE_URL")      #retrieves env variable DATABASE_URL that contains the specifics of the postgresql database, user, pass, and db to connecto to.
-if db_url is not None:                  #code runs only if DATABASE_URL != None
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://") #configures the databasse URI to use postgresql
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db" #if db_url == None, condigures the database to use sqlite with a test.db file database
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+from models import db #db connection to sqlalchemy, could be changed for any other name.
+from cache import DrinkCatalog #in memory copy of the drink menu
+from serialization import FastJSONProvider #orjson based JSON encoding
+from routes import api #all the endpoints and CLI commands
+from ratelimit import RateLimiter #rate limit and load shedding of the writes
+import jobs #background job workers
+
+def database_config():
+    #Configure database 
+    config = {}
+    db_url = os.getenv("DATABASE_URL")      #retrieves env variable DATABASE_URL that contains the specifics of the postgresql database, user, pass, and db to connecto to.
+    if db_url is not None:                  #code runs only if DATABASE_URL != None
+        config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://") #configures the databasse URI to use postgresql
+    else:
+        config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db" #if db_url == None, condigures the database to use sqlite with a test.db file database
+    config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    #Connection pool, every value can be changed from the environment (ej: one gunicorn worker per pool on Render)
+    engine_options = {
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1", #tests the connection before using it, no more stale connections after idle periods
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),    #seconds before a connection is replaced, below the server/proxy idle timeout
+    }
+    if not config['SQLALCHEMY_DATABASE_URI'].startswith("sqlite"):
+        engine_options["pool_size"] = int(os.getenv("DB_POOL_SIZE", 5))          #connections kept open per worker
+        engine_options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", 10))   #extra connections opened under load and closed afterwards
+        engine_options["pool_timeout"] = int(os.getenv("DB_POOL_TIMEOUT", 30))   #seconds a request waits for a free connection before failing
+    if config['SQLALCHEMY_DATABASE_URI'].startswith("postgresql"):
+        statement_timeout = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))    #postgres cancels any query running longer than this
+        engine_options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+    return config
 
 #psql -h localhost -U gitpod example
 #psql: This is the command to start the PostgreSQL interactive terminal program.
@@ -28,109 +45,53 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 #-U gitpod: This option specifies the username to use when connecting to the PostgreSQL server. 
 #example: This is the name of the database to connect to. By default in Postgres it would be the database of with the same name as the user.
 
-#Database migration 
-#when working with RDBMS its common to make changes to the structure of your database schema over time. Migration tools help manage these changes.
-MIGRATE = Migrate(app, db) #create instance of Migrate class asigns it to MIGRATE. This initializes the Flask-Migrate extension with the Flask application and SQLAlchemy, enabling database migrations for the application. Basically allows successful migration from app to the db.
-
-#Initialize database
-db.init_app(app)     #This method initializes the SQLAlchemy extension with the Flask application. It tells SQLAlchemy which Flask application it should be working with.
-CORS(app)            #Enables CORS support for the Flask app, allowing it to handle requests from different origins.
-setup_admin(app)     #Configures the Flask-Admin interface for the Flask app
-
-# Handle/serialize errors like a JSON object
-@app.errorhandler(APIException)
-def handle_invalid_usage(error):
-    return jsonify(error.to_dict()), error.status_code #Defines an error handler for instances of APIException, returning JSON-formatted error responses.
-
-# generate sitemap with all your endpoints
-@app.route('/')
-def sitemap():
-    return generate_sitemap(app) #Defines a route / that returns a sitemap of all endpoints in the application.
-
-@app.route('/user', methods=['GET'])
-def handle_hello():
-
-    users = User.query.all() #SELECT * from users AND returns python objects, we can only jsonify dictionaries 
-
-    return jsonify([user.serialize() for user in users]), 200 #[functionCalled for element in iterable]
-
-@app.route('/drink', methods=['POST', "GET"])
-def add_drink():
-    
-    if request.method == "GET":
-        drinks = Drink.query.all()
-        return jsonify([drink.serialize() for drink in drinks]),200
-
-    body = request.json
-    #receive from body of request
-    name = body.get("name")
-    price = body.get("price")
-
-    if name != None and price != None: #if properties not None, create new instance of Class Drink(which is a row in the table)
-        new_drink = Drink(name=name, price=price) #constructor 
-        db.session.add(new_drink) #RAM
-        db.session.commit() #ID, al guardar en base de datos, se asigna ID automatico 
-        return jsonify(new_drink.serialize()), 200
-    return jsonify({"msg": "Error missing keys"}), 400
-
-@app.route('/drink/<int:id>', methods=['DELETE', "PUT"])
-def handle_drink(id):
-    search = Drink.query.filter_by(id=id).one_or_none() #si encuentra lo devuelve y si no devuelve None
-
-    if request.method == "PUT":
-        if search != None:
-            body = request.json
-            new_name = body.get("name",None)
-            new_price = body.get("price", None)
-            if new_name != None:
-                search.name = new_name
-            if new_price != None:
-                search.price = new_price
-            db.session.commit()
-            return jsonify(search.serialize()), 200
-        
-        return jsonify({"msg": "drink not found"}), 404
-    else:
-        if search != None:            
-            db.session.delete(search)
-            db.session.commit()
-            return jsonify({"msg": "ey lo lograste, borraste exitoso"}),200
-
-        else:
-            return jsonify({"msg": "drink not found"}),404
-
-    return jsonify({"msg": "something happended"}),500
-
-@app.route("/orders", methods=['GET'])
-def get_orders():
-    orders = Order.query.all()
-    return jsonify([order.serialize() for order in orders]), 200
-
-@app.route("/orders", methods=['POST'])
-def add_order():
-    body = request.json
-    order_name = body.get("name")
-    new_order = Order(order_name) #objeto solo con nombre que viene del body
-    drinks_ids = body.get("drinks") #ids que vienen
-
-    for drink_id in drinks_ids:
-        # se busca cada id en tabla de Drinks para ver si se encuentra
-        search_drink = Drink.query.filter_by(id = drink_id).one_or_none()
-        #si se encuentra, se append TODA info de drink a new_order.drinks
-        if search_drink != None:
-            new_order.drinks.append(search_drink)
-            #aqui ya tiene info completa de cada drink 
-
-        # si no se encuentra drink en tabla de Drinks, se regresa ERROR.
-        else:
-            return jsonify({"msg": "drink not found"}),404
-        
-    db.session.add(new_order) #por la clase de la variable se sabe a que tabla ingresar
-    db.session.commit()
-        
-    return jsonify(new_order.serialize()), 201 
+class MigrationCommands(click.Group): #`flask db`, Flask-Migrate (and Alembic) are imported and set up when one of its commands runs
+    def migrate_commands(self):
+        from flask import current_app
+        from flask_migrate import Migrate #flask extension that handles database migrations for Flask applications using Alembic. Database operations are provided as command line under flash db command.
+        if "migrate" not in current_app.extensions:
+            Migrate(current_app, db) #This initializes the Flask-Migrate extension with the Flask application and SQLAlchemy, it replaces this group with the `db` commands of Flask-Migrate
+        return current_app.cli.commands["db"]
+
+    def make_context(self, info_name, args, parent=None, **extra): #the command line is parsed and run by the group of Flask-Migrate
+        return self.migrate_commands().make_context(info_name, args, parent=parent, **extra)
+
+def create_app(config=None):
+    #Create Flask App
+    app = Flask(__name__)                   #creates a flask application instance
+    app.url_map.strict_slashes = False      #configures app to ignore trailing slashes in route URLs.
+    app.json = FastJSONProvider(app)        #jsonify uses orjson when it is installed
+    app.config.update(database_config())
+    app.config["ADMIN_ENABLED"] = os.getenv("ADMIN_ENABLED", "1") == "1"
+    app.config.update(config or {})
+
+    #Database migration 
+    #when working with RDBMS its common to make changes to the structure of your database schema over time. Migration tools help manage these changes.
+    #Flask-Migrate (and Alembic) is only needed by the `flask db` commands, web workers do not import it
+    app.cli.add_command(MigrationCommands("db", help="Perform database migrations."))
+
+    #Initialize database
+    db.init_app(app)     #This method initializes the SQLAlchemy extension with the Flask application. It tells SQLAlchemy which Flask application it should be working with.
+    CORS(app)            #Enables CORS support for the Flask app, allowing it to handle requests from different origins.
+    if app.config["ADMIN_ENABLED"]: #the Flask-Admin interface on /admin, same app and database engine as the API
+        from admin import setup_admin #flask-admin is only imported when it is enabled
+        setup_admin(app)
+    if os.getenv("PROFILING_ENABLED") == "1":
+        from instrumentation import setup_profiling #per request timings, Server-Timing header and /metrics
+        setup_profiling(app) #Measures every request (SQL statements, db time, serialization time)
+
+    #Drink catalog cache, serves GET /drink and the drink lookups of POST /orders without going to the database
+    app.extensions["drink_catalog"] = DrinkCatalog(
+        ttl=int(os.getenv("CATALOG_CACHE_TTL", 60)),
+        max_size=int(os.getenv("CATALOG_CACHE_MAX_SIZE", 5000))
+    )
+
+    app.extensions["rate_limiter"] = RateLimiter.from_env() #RATELIMIT_* settings, RATELIMIT_ENABLED=0 turns it off
+    jobs.init_app(app) #JOB_WORKERS threads run the background jobs of this process
+    app.register_blueprint(api)
+    return app
 
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
-    app.run(host='0.0.0.0', port=PORT, debug=False)
+    create_app().run(host='0.0.0.0', port=PORT, debug=False)
@@ -0,0 +1,153 @@
+"""
+Alternative ASGI entry point, the WSGI one (wsgi.py + gunicorn) keeps working as before:
+
+    $ uvicorn asgi:application --app-dir ./src/ --workers 2
+
+The read endpoints (GET /healthz, /user, /drink and /orders) run on an async SQLAlchemy engine, so one worker
+waits on many database round-trips at the same time instead of blocking on each of them.
+Every other request (writes, streaming, admin, CLI-only features) is handed to the Flask app of create_app().
+"""
+import os
+import time
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import selectinload
+from starlette.requests import Request
+from starlette.responses import Response
+from werkzeug.http import parse_etags, parse_date, http_date
+from app import create_app
+from models import User, Drink, Order, TableVersion
+from utils import MAX_PAGE_SIZE, version_etag
+
+flask_app = create_app()
+
+def async_database_url(url):
+    # same database as the Flask app, with the asyncio driver
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:") or url.startswith("postgresql+psycopg2:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+def async_engine_options(url):
+    # the same DB_* pool settings as app.py, asyncpg takes the statement timeout as a server setting
+    options = {key: value for key, value in flask_app.config["SQLALCHEMY_ENGINE_OPTIONS"].items() if key != "connect_args"}
+    if url.startswith("postgresql"):
+        options["connect_args"] = {"server_settings": {"statement_timeout": os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000")}}
+    return options
+
+database_url = async_database_url(flask_app.config["SQLALCHEMY_DATABASE_URI"])
+engine = create_async_engine(database_url, **async_engine_options(database_url))
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+class FlaskJSONResponse(Response):
+    # same body as jsonify() in the Flask app (orjson, sorted keys), the two entry points share the strong ETags
+    media_type = "application/json"
+
+    def render(self, content):
+        return flask_app.json.response(content).get_data()
+
+def error(message, status_code=400):
+    return FlaskJSONResponse({"message": message}, status_code=status_code)
+
+def page_args(request):
+    # same rules as utils.get_page_args
+    try:
+        limit = int(request.query_params["limit"]) if "limit" in request.query_params else None
+        after = int(request.query_params["after"]) if "after" in request.query_params else None
+    except ValueError:
+        return None, None, error("limit and after must be integers")
+    if limit is not None and not 0 < limit <= MAX_PAGE_SIZE:
+        return None, None, error(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit, after, None
+
+async def conditional_list(request, endpoint, table, model, serialize, options=()):
+    # async version of @conditional + utils.list_response for the plain list and ?limit=&after= pages
+    limit, after, invalid = page_args(request)
+    if invalid is not None:
+        return invalid
+    async with Session() as session:
+        versions = {row.name: row for row in (await session.scalars(
+            select(TableVersion).where(TableVersion.name.in_([table])))).all()}
+        etag, last_modified = version_etag(endpoint, [table], versions, request.scope["query_string"])
+        headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+        if last_modified is not None:
+            headers["Last-Modified"] = http_date(last_modified)
+
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = parse_date(request.headers.get("if-modified-since"))
+        if if_none_match:
+            not_modified = parse_etags(if_none_match).contains(etag)
+        else:
+            not_modified = last_modified is not None and if_modified_since is not None \
+                and last_modified <= if_modified_since.replace(tzinfo=None)
+        if not_modified:
+            return Response(status_code=304, headers=headers)
+
+        query = select(model).options(*options).order_by(model.id)
+        if after is not None:
+            query = query.where(model.id > after)
+        if limit is None and after is None:
+            rows = (await session.scalars(query)).all()
+            return FlaskJSONResponse(serialize(rows), headers=headers)
+
+        page_size = limit or MAX_PAGE_SIZE
+        rows = (await session.scalars(query.limit(page_size + 1))).all()
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            headers["X-Next-Cursor"] = str(rows[-1].id)
+            headers["Link"] = f'<{request.url.path}?limit={page_size}&after={rows[-1].id}>; rel="next"'
+        return FlaskJSONResponse(serialize(rows), headers=headers)
+
+async def healthz(request):
+    result = {"status": "ok"}
+    started = time.perf_counter()
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+    except (SQLAlchemyError, OSError) as exception:
+        result["status"] = "error"
+        result["db_error"] = exception.__class__.__name__
+    result["db_latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    pool = engine.pool
+    result["pool"] = {"class": pool.__class__.__name__}
+    for stat in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, stat):
+            result["pool"][stat] = getattr(pool, stat)()
+    return FlaskJSONResponse(result, status_code=200 if result["status"] == "ok" else 503, headers={"Cache-Control": "no-store"})
+
+async def list_users(request):
+    return await conditional_list(request, "api.handle_hello", "user", User, lambda users: [user.serialize() for user in users])
+
+async def list_drinks(request):
+    return await conditional_list(request, "api.add_drink", "drink", Drink, lambda drinks: [drink.serialize() for drink in drinks])
+
+async def list_orders(request):
+    return await conditional_list(request, "api.get_orders", "order", Order, lambda orders: [order.serialize() for order in orders],
+                                  options=[selectinload(Order.items)])
+
+flask_wsgi = WSGIMiddleware(flask_app)
+
+ASYNC_ROUTES = {"/healthz": healthz, "/user": list_users, "/drink": list_drinks, "/orders": list_orders}
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # plain lists and pages are served async, writes and streaming (?stream=) stay in Flask
+    endpoint = ASYNC_ROUTES.get(scope["path"].rstrip("/") or "/") if scope["type"] == "http" else None
+    if endpoint is not None and scope["method"] in ("GET", "HEAD") and b"stream=" not in scope["query_string"]:
+        response = await endpoint(Request(scope, receive))
+        response.headers["Access-Control-Allow-Origin"] = "*" #same as CORS(app) in app.py
+        await response(scope, receive, send)
+    else:
+        await flask_wsgi(scope, receive, send)
@@ -0,0 +1,136 @@
+"""
+Bulk import/export of the drink menu as CSV (name,price) or NDJSON ({"name": ..., "price": ...} per line).
+Used by POST /drink/bulk, GET /drink/export and the `flask import-drinks` / `flask export-drinks` commands.
+"""
+import codecs
+import csv
+import io
+import json
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from models import db, Drink, TableVersion
+from utils import iter_keyset
+
+FORMATS = ("csv", "ndjson")
+BATCH_SIZE = 1000 #rows per INSERT ... ON CONFLICT statement and per transaction
+MAX_REPORTED_ERRORS = 1000 #the response lists at most this many bad rows, error_count has the real number
+UPSERT_DIALECTS = ("mysql", "postgresql", "sqlite")
+
+def upsert_statement(table, index_elements, update_columns=(), increment_columns=(), dialect=None):
+    # INSERT ... ON CONFLICT (index_elements) DO UPDATE in the dialect of the current database (or the given one),
+    # update_columns take the new value, increment_columns add the new value to the stored one (counters)
+    dialect = dialect or db.session.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(table)
+        new = stmt.inserted
+    elif dialect == "postgresql":
+        stmt = postgresql.insert(table)
+        new = stmt.excluded
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table)
+        new = stmt.excluded
+    else:
+        raise RuntimeError(f"upsert (bulk import, analytics) is not supported on {dialect}, "
+                           f"DATABASE_URL must point to one of: {', '.join(UPSERT_DIALECTS)}")
+    set_ = {column: new[column] for column in update_columns}
+    set_.update({column: table.c[column] + new[column] for column in increment_columns})
+    if dialect == "mysql":
+        return stmt.on_duplicate_key_update(set_)
+    return stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+
+def iter_lines(stream, chunk_size=64 * 1024):
+    # text lines of a binary stream read in chunks, works with any WSGI input (gunicorn's does not support io wrappers)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        pending += decoder.decode(chunk or b"", final=not chunk)
+        # only \n ends a line (\r\n keeps its \r), splitlines would also cut at U+2028, \x85... which JSON strings may contain
+        *lines, pending = pending.split("\n") #the last piece is an incomplete line, or "" after a final \n
+        for line in lines:
+            yield line + "\n"
+        if not chunk:
+            if pending:
+                yield pending
+            return
+
+def parse_rows(lines, fmt):
+    # yields (line number, row dict or None, error message or None) without reading the whole input in memory
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_num, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield line_num, None, f"invalid json: {error}"
+            continue
+        if not isinstance(row, dict):
+            yield line_num, None, "expected a json object"
+            continue
+        yield line_num, row, None
+
+def clean_row(row):
+    name = row.get("name")
+    name = name.strip() if isinstance(name, str) else None
+    if not name:
+        raise ValueError("missing name")
+    if len(name) > 120:
+        raise ValueError("name longer than 120 characters")
+    try:
+        price = float(row.get("price"))
+    except (TypeError, ValueError):
+        raise ValueError("missing or invalid price")
+    if price < 0:
+        raise ValueError("price can not be negative")
+    return {"name": name, "price": price}
+
+def import_drinks(lines, fmt, batch_size=BATCH_SIZE):
+    stmt = upsert_statement(Drink.__table__, ["name"], ["price"])
+    result = {"upserted": 0, "error_count": 0, "errors": []}
+
+    def flush(batch):
+        if not batch:
+            return
+        # Postgres refuses to update the same row twice in one statement, the last row of a repeated name wins
+        rows = list(batch.values())
+        db.session.execute(stmt, rows)
+        TableVersion.bump_after_commit(db.session, {"drink"}) #Core statements do not go through the flush hook
+        db.session.commit()
+        result["upserted"] += len(rows)
+        batch.clear()
+
+    batch = {}
+    for line_num, row, error in parse_rows(lines, fmt):
+        if error is None:
+            try:
+                row = clean_row(row)
+            except ValueError as invalid:
+                error = str(invalid)
+        if error is not None:
+            result["error_count"] += 1
+            if len(result["errors"]) < MAX_REPORTED_ERRORS:
+                result["errors"].append({"line": line_num, "error": error})
+            continue
+        batch[row["name"]] = row
+        if len(batch) >= batch_size:
+            flush(batch)
+    flush(batch)
+    return result
+
+def export_drinks(fmt):
+    # generator of text chunks, one chunk per batch of drinks
+    if fmt == "csv":
+        yield "name,price\n"
+    for drinks in iter_keyset(Drink.query, Drink.id):
+        if fmt == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator="\n").writerows((drink.name, drink.price) for drink in drinks)
+            chunk = buffer.getvalue()
+        else:
+            chunk = "".join(json.dumps({"name": drink.name, "price": drink.price}) + "\n" for drink in drinks)
+        db.session.expunge_all()
+        yield chunk
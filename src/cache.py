@@ -0,0 +1,73 @@
+"""
+In-process read-through cache of the drink catalog (the menu).
+The menu is read by GET /drink and by every POST /orders but only changes through drink writes, so it is kept
+in memory and reloaded when the version of the drink table (table_version) changes. Every committed write bumps
+that version in the database, whatever worker or tool (API, admin, bulk import) made it.
+"""
+import threading
+import time
+from flask import g, has_request_context
+from models import Drink, TableVersion
+from serialization import rows_as_dicts
+
+def drink_version():
+    # the version @conditional already read for this request's ETag, so the body and the ETag always match,
+    # otherwise one primary key lookup
+    versions = g.get("table_versions", {}) if has_request_context() else {}
+    if "drink" in versions:
+        return versions["drink"]
+    row = TableVersion.current(["drink"]).get("drink")
+    return row.version if row is not None else 0
+
+class DrinkCatalog:
+    def __init__(self, ttl=60, max_size=5000):
+        self.ttl = ttl #seconds a snapshot is served before reloading it from the database, even if the version did not change
+        self.max_size = max_size #menus bigger than this are not cached, lookups go to the database
+        self.hits = 0
+        self.misses = 0
+        self._drinks = None #{id: serialized drink} ordered by id
+        self._version = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def _snapshot(self):
+        version = drink_version()
+        with self._lock:
+            if self._version == version and time.monotonic() < self._expires_at:
+                if self._drinks is not None:
+                    self.hits += 1
+                else: #menu too big to cache, the caller queries the database
+                    self.misses += 1
+                return self._drinks
+            self.misses += 1
+            drinks = rows_as_dicts(Drink.listing().order_by(Drink.id).limit(self.max_size + 1).all())
+            self._drinks = {drink["id"]: drink for drink in drinks} if len(drinks) <= self.max_size else None
+            self._version = version
+            self._expires_at = time.monotonic() + self.ttl
+            return self._drinks
+
+    def all(self): #list of serialized drinks, same as [drink.serialize() for drink in Drink.query.all()]
+        drinks = self._snapshot()
+        if drinks is None:
+            return rows_as_dicts(Drink.listing().order_by(Drink.id).all())
+        return list(drinks.values())
+
+    def get_many(self, ids): #{id: serialized drink} for the ids that exist
+        drinks = self._snapshot()
+        if drinks is None:
+            return {drink["id"]: drink for drink in rows_as_dicts(Drink.listing().filter(Drink.id.in_(set(ids))).all())}
+        return {drink_id: drinks[drink_id] for drink_id in ids if drink_id in drinks}
+
+    def invalidate(self): #drops the snapshot of this process right away, the other processes see the new version
+        with self._lock:
+            self._drinks = None
+            self._version = None
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._drinks) if self._drinks is not None else 0,
+            "ttl": self.ttl,
+            "max_size": self.max_size
+        }
@@ -0,0 +1,65 @@
+"""
+Idempotency-Key support for retry-safe POSTs (POST /orders).
+The key is saved with the response in the same transaction as the write, a retry with the same key gets the saved
+response back without doing the work again. Keys expire after IDEMPOTENCY_KEY_TTL seconds (24 hours by default).
+"""
+import hashlib
+import json
+import os
+import random
+from datetime import timedelta
+from flask import Response, current_app, jsonify
+from sqlalchemy.exc import IntegrityError
+from models import db, utcnow, IdempotencyKey
+
+MAX_KEY_LENGTH = 255
+PURGE_PROBABILITY = 0.01 #about one request in a hundred deletes the expired keys, keeps the table bounded
+
+def ttl():
+    return timedelta(seconds=int(os.getenv("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60)))
+
+def request_hash(body):
+    # sha256 of the parsed JSON body in a canonical form, a retry that serializes the same body differently
+    # (key order, spaces) is the same request
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def purge_expired(): #returns how many keys were deleted, the caller commits
+    return IdempotencyKey.query.filter(IdempotencyKey.created_at < utcnow() - ttl()).delete(synchronize_session=False)
+
+def _replay_response(record, body_hash):
+    if record.request_hash != body_hash:
+        return jsonify({"msg": "Idempotency-Key already used with a different request"}), 422
+    response = Response(record.response_body, status=record.status_code, mimetype="application/json")
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+def replay(key, body_hash):
+    # saved response for a key that is still valid, None the first time
+    record = db.session.get(IdempotencyKey, key)
+    if record is None or record.created_at < utcnow() - ttl():
+        return None
+    return _replay_response(record, body_hash)
+
+def reserve(key, body_hash):
+    # inserts the key in the current transaction before doing the work, returns (record, None)
+    # if a concurrent request with the same key committed first returns (None, its saved response)
+    IdempotencyKey.query.filter(IdempotencyKey.key == key, IdempotencyKey.created_at < utcnow() - ttl()) \
+        .delete(synchronize_session=False)
+    if random.random() < PURGE_PROBABILITY:
+        purge_expired()
+    record = IdempotencyKey(key=key, request_hash=body_hash, status_code=0, response_body="")
+    db.session.add(record)
+    try:
+        db.session.flush() #on Postgres this waits for a concurrent transaction that holds the same key
+    except IntegrityError:
+        db.session.rollback()
+        record = db.session.get(IdempotencyKey, key)
+        if record is None: #the other request failed and rolled back, the client can retry
+            return None, (jsonify({"msg": "a request with this Idempotency-Key is in progress, retry"}), 409)
+        return None, _replay_response(record, body_hash)
+    return record, None
+
+def save(record, result, status_code): #stores the response, commits together with the write
+    record.status_code = status_code
+    record.response_body = current_app.json.dumps(result)
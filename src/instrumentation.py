@@ -0,0 +1,129 @@
+"""
+Opt-in request profiling, enabled with PROFILING_ENABLED=1.
+Measures wall time, number of SQL statements, database time and JSON serialization time of every request,
+sends them back in the Server-Timing header and exposes per-route Prometheus metrics on /metrics.
+"""
+import logging
+import os
+import threading
+import time
+from flask import g, request, Response, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from serialization import FastJSONProvider
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) #seconds
+
+def _profile():
+    # per-request counters, None outside of a profiled request (CLI commands, background threads)
+    if has_request_context():
+        return g.get("profile")
+    return None
+
+# the start time lives on the execution context, so a statement that fails leaves nothing behind on the connection
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _profile() is not None:
+        context._query_started = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _profile()
+    started = getattr(context, "_query_started", None)
+    if profile is not None and started is not None:
+        profile["queries"] += 1
+        profile["db"] += time.perf_counter() - started
+
+class TimedJSONProvider(FastJSONProvider): #adds the time spent in dumps to the request profile
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            profile = _profile()
+            if profile is not None:
+                profile["serialize"] += time.perf_counter() - started
+
+class RouteMetrics: #per-route counters and latency histograms shared by the threads of the worker
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, status, seconds, queries, db_seconds):
+        with self._lock:
+            metrics = self._routes.setdefault((route, method), {
+                "buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0,
+                "queries": 0, "db_seconds": 0.0, "statuses": {}
+            })
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    metrics["buckets"][i] += 1
+            metrics["count"] += 1
+            metrics["sum"] += seconds
+            metrics["queries"] += queries
+            metrics["db_seconds"] += db_seconds
+            metrics["statuses"][status] = metrics["statuses"].get(status, 0) + 1
+
+    def render(self): #Prometheus text exposition format
+        lines = [
+            "# HELP http_request_duration_seconds Request wall time per route.",
+            "# TYPE http_request_duration_seconds histogram"
+        ]
+        with self._lock:
+            routes = sorted(self._routes.items())
+            for (route, method), metrics in routes:
+                labels = f'route="{route}",method="{method}"'
+                for bound, count in zip(self.buckets, metrics["buckets"]):
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {metrics["count"]}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {metrics["sum"]:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {metrics["count"]}')
+            lines += ["# HELP http_requests_total Requests per route and status.", "# TYPE http_requests_total counter"]
+            for (route, method), metrics in routes:
+                for status, count in sorted(metrics["statuses"].items()):
+                    lines.append(f'http_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+            lines += ["# HELP http_request_db_queries_total SQL statements issued per route.", "# TYPE http_request_db_queries_total counter"]
+            for (route, method), metrics in routes:
+                lines.append(f'http_request_db_queries_total{{route="{route}",method="{method}"}} {metrics["queries"]}')
+            lines += ["# HELP http_request_db_seconds_total Time spent in the database per route.", "# TYPE http_request_db_seconds_total counter"]
+            for (route, method), metrics in routes:
+                lines.append(f'http_request_db_seconds_total{{route="{route}",method="{method}"}} {metrics["db_seconds"]:.6f}')
+        return "\n".join(lines) + "\n"
+
+def setup_profiling(app):
+    query_warning_threshold = int(os.getenv("QUERY_WARNING_THRESHOLD", 20)) #more statements than this in one request is logged (N+1)
+    metrics = RouteMetrics()
+    app.extensions["route_metrics"] = metrics
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_profile():
+        g.profile = {"started": time.perf_counter(), "queries": 0, "db": 0.0, "serialize": 0.0}
+
+    @app.after_request
+    def finish_profile(response):
+        # streamed responses are measured up to the first byte, the rest of the body is produced after this point
+        profile = g.get("profile")
+        if profile is None:
+            return response
+        total = time.perf_counter() - profile["started"]
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        if route != "/metrics":
+            metrics.observe(route, request.method, response.status_code, total, profile["queries"], profile["db"])
+
+        response.headers.add("Server-Timing", ", ".join([
+            f'total;dur={total * 1000:.2f}',
+            f'db;dur={profile["db"] * 1000:.2f};desc="{profile["queries"]} queries"',
+            f'serialize;dur={profile["serialize"] * 1000:.2f}'
+        ]))
+        if profile["queries"] > query_warning_threshold:
+            logger.warning("%s %s issued %d SQL statements (threshold %d), possible N+1 query",
+                           request.method, route, profile["queries"], query_warning_threshold)
+        return response
+
+    def metrics_view():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+    app.add_url_rule("/metrics", "metrics", metrics_view, methods=["GET"])
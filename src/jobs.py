@@ -0,0 +1,158 @@
+"""
+Durable background jobs kept in the job table, no external broker needed.
+enqueue() adds a job to the current transaction, so it only exists if the request that needs it commits.
+Workers claim due jobs in batches (SELECT ... FOR UPDATE SKIP LOCKED on Postgres, a single UPDATE ... RETURNING
+on SQLite) and run each one in its own transaction; a failing job is retried with exponential backoff
+until max_attempts and then left as failed.
+
+Workers run as threads of the web process (JOB_WORKERS, started on the first request) and/or as a dedicated
+process with `flask run-worker`.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+from sqlalchemy import and_, or_, select, update
+from models import db, utcnow, Job
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 10 #jobs claimed per query
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 2 #seconds before the first retry, doubled on every attempt
+MAX_BACKOFF = 3600
+LOCK_TIMEOUT = timedelta(minutes=10) #a job running longer than this is considered abandoned and claimed again
+
+HANDLERS = {}
+
+def handler(kind): #registers the function that runs the jobs of this kind, it gets the payload as keyword arguments
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+def enqueue(kind, run_at=None, max_attempts=MAX_ATTEMPTS, **payload): #the caller commits
+    if kind not in HANDLERS:
+        raise ValueError(f"no handler for job {kind}")
+    job = Job(kind=kind, payload=json.dumps(payload), run_at=run_at or utcnow(), max_attempts=max_attempts)
+    db.session.add(job)
+    return job
+
+def backoff(attempts): #seconds before the next try, with jitter so failed jobs do not all come back at once
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), MAX_BACKOFF)
+    return delay * random.uniform(0.5, 1.0)
+
+def claim(worker_id, batch_size=BATCH_SIZE):
+    # marks up to batch_size due jobs as running for this worker and returns them, commits
+    now = utcnow()
+    due = or_(and_(Job.status == "pending", Job.run_at <= now),
+              and_(Job.status == "running", Job.locked_at < now - LOCK_TIMEOUT))
+    # rows locked by another worker are skipped instead of waited for (Postgres, MySQL), SQLite ignores FOR UPDATE
+    candidates = select(Job.id).where(due).order_by(Job.run_at, Job.id).limit(batch_size).with_for_update(skip_locked=True)
+    claimed = update(Job).values(status="running", locked_at=now, locked_by=worker_id, attempts=Job.attempts + 1) \
+        .execution_options(synchronize_session=False)
+    columns = (Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts)
+    if db.session.get_bind().dialect.update_returning:
+        # one statement: SQLite runs writes one at a time, so no two workers get the same rows
+        jobs = db.session.execute(claimed.where(Job.id.in_(candidates.scalar_subquery())).returning(*columns)).all()
+    else:
+        ids = db.session.execute(candidates).scalars().all() #the row locks are held until the commit
+        jobs = []
+        if ids: #read after the UPDATE, attempts already counts this run
+            db.session.execute(claimed.where(Job.id.in_(ids)))
+            jobs = db.session.execute(select(*columns).where(Job.id.in_(ids))).all()
+    db.session.commit()
+    return sorted(jobs, key=lambda job: job.id)
+
+def run(job):
+    # the handler and the status change commit together, a failed job leaves nothing behind
+    try:
+        HANDLERS[job.kind](**json.loads(job.payload))
+        db.session.execute(update(Job).where(Job.id == job.id).values(status="done", finished_at=utcnow(), last_error=None))
+        db.session.commit()
+        return True
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc(limit=5)
+        if job.attempts >= job.max_attempts:
+            values = {"status": "failed", "finished_at": utcnow()}
+            logger.error("job %s (%s) failed after %d attempts\n%s", job.id, job.kind, job.attempts, error)
+        else:
+            values = {"status": "pending", "run_at": utcnow() + timedelta(seconds=backoff(job.attempts))}
+            logger.warning("job %s (%s) failed, attempt %d of %d", job.id, job.kind, job.attempts, job.max_attempts)
+        db.session.execute(update(Job).where(Job.id == job.id).values(last_error=error, locked_at=None, **values))
+        db.session.commit()
+        return False
+
+def work(worker_id, batch_size=BATCH_SIZE): #claims and runs one batch, returns how many jobs it got
+    jobs = claim(worker_id, batch_size)
+    for job in jobs:
+        run(job)
+    return len(jobs)
+
+def purge_finished(older_than): #deletes done jobs finished before older_than, the caller commits
+    return Job.query.filter(Job.status == "done", Job.finished_at < older_than).delete(synchronize_session=False)
+
+class WorkerPool: #threads that claim and run jobs, each in its own app context and session
+    def __init__(self, app, workers, batch_size=BATCH_SIZE, poll_interval=1.0):
+        self.app = app
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for number in range(self.workers):
+            worker_id = f"{socket.gethostname()}-{os.getpid()}-{number}"
+            thread = threading.Thread(target=self._loop, args=(worker_id,), name=f"job-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self): #a job was just committed, wake an idle worker instead of waiting for the next poll
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _loop(self, worker_id):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    done = work(worker_id, self.batch_size)
+            except Exception:
+                logger.exception("job worker %s could not claim jobs", worker_id)
+                done = 0
+            if not done: #idle, a full batch means there may be more waiting
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+def init_app(app):
+    # JOB_WORKERS threads per web process, started by the first request so CLI commands and
+    # the gunicorn master (with --preload) do not run any
+    workers = int(os.getenv("JOB_WORKERS", 1))
+    if workers <= 0:
+        return
+    pool = WorkerPool(app, workers, poll_interval=float(os.getenv("JOB_POLL_INTERVAL", 1)))
+    started = threading.Lock()
+
+    @app.before_request
+    def start_job_workers():
+        if "job_workers" not in app.extensions:
+            with started:
+                if "job_workers" not in app.extensions:
+                    pool.start()
+                    app.extensions["job_workers"] = pool
+
+def notify(app): #wakes the in-process workers, if this process has any
+    pool = app.extensions.get("job_workers")
+    if pool is not None:
+        pool.notify()
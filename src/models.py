@@ -1,8 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy #module within Flask that provides integration with SQLAlchemy and simplifies database integrations. 
 #SQLAlchemy is the amin class provided by flask_sqlalchemy. 
+from datetime import datetime, timezone
+from itertools import chain
+from sqlalchemy import event
+from sqlalchemy.orm import selectinload, Session
 
 db = SQLAlchemy() #creates instance of the SQLalchemy class, use to interact with the database throught the app.
 
+def utcnow(): #naive UTC datetime, the DateTime columns have no time zone
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class User(db.Model): #from db.Model inherits all the functionality and features provided by SQLAlchemy's Model class, allowing it to represent a table in the database.
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -19,6 +26,10 @@ class User(db.Model): #from db.Model inherits all the functionality and features
             # do not serialize the password, its a security breach
         }
 
+    @classmethod
+    def listing(cls): #only the serialized columns as plain rows, no ORM objects to build for big listings
+        return db.session.query(cls.id, cls.email)
+
 class Drink(db.Model):
     __tablename__ = "drink"
     id = db.Column(db.Integer, primary_key=True)
@@ -39,35 +50,198 @@ class Drink(db.Model):
             "price": self.price
             # do not serialize the password, its a security breach
         }
+
+    @classmethod
+    def listing(cls): #only the serialized columns as plain rows, no ORM objects to build for big listings
+        return db.session.query(cls.id, cls.name, cls.price)
     
-association_table_orders = db.Table(
-    "association_table_order",
-    db.metadata,
-    db.Column("order", db.ForeignKey("order.id")),
-    db.Column("drink", db.ForeignKey("drink.id"))
-)
+class OrderItem(db.Model): #one line of an order, name and price are copied when the order is made so editing a drink does not change old orders
+    __tablename__ = "order_item"
+    order_id = db.Column(db.Integer, db.ForeignKey("order.id"), primary_key=True)
+    drink_id = db.Column(db.Integer, db.ForeignKey("drink.id"), primary_key=True, index=True) #the primary key index starts with order_id, this one serves "orders that have drink X" and the FK check of DELETE /drink
+    drink_name = db.Column(db.String(120), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    unit_price = db.Column(db.Float, nullable=False) #price at the moment of the purchase
+
+    def __repr__(self):
+        return f'<OrderItem {self.order_id} {self.drink_name} x{self.quantity}>'
+
+    def serialize(self):
+        return serialize_item(self)
+
+def serialize_item(item): #works for OrderItem objects and for rows with the same columns
+    return {
+        "drink_id": item.drink_id,
+        "name": item.drink_name,
+        "price": item.unit_price,
+        "quantity": item.quantity
+    }
+
+def serialize_order(order_id, total, items):
+    return{
+        "id": order_id,
+        # one entry per unit like before, with the name and price of the moment of the purchase
+        "drinks": [{"id": item.drink_id, "name": item.drink_name, "price": item.unit_price}
+                   for item in items for _ in range(item.quantity)],
+        "items": [serialize_item(item) for item in items],
+        "total": total
+    }
     
 class Order(db.Model):
     __tablename__ = 'order'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(250), nullable=True)
+    name = db.Column(db.String(250), nullable=True, index=True) #admin search and filter
+    total = db.Column(db.Float, nullable=False, default=0) #saved when the order is made, no need to add up the items on every read
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True) #admin sort and date filters
 
-    drinks = db.relationship(Drink, secondary=association_table_orders) #para cada bebida va tener una orden automatico con backref 
+    items = db.relationship(OrderItem, order_by=OrderItem.drink_id, cascade="all, delete-orphan") #deleting an order deletes its lines
 
     def __init__(self,name):
         self.name = name
 
-    def get_total(self):
-        total = 0
-        for drink in self.drinks:
-            total = total + drink.price
-        return total
+    def serialize(self):
+        return serialize_order(self.id, self.total, self.items)
+
+    @classmethod
+    def query_with_items(cls): #items of all the orders are loaded in a single extra SELECT ... WHERE order_id IN (...)
+        return cls.query.options(selectinload(cls.items))
+
+    @classmethod
+    def listing(cls): #only the serialized columns as plain rows, no ORM objects to build for big listings
+        return db.session.query(cls.id, cls.total)
+
+    @staticmethod
+    def serialize_rows(rows): #rows of Order.listing() in id order, the items of all of them come from one column query
+        items_by_order = {row.id: [] for row in rows}
+        if rows:
+            # the listing, a page or a streamed batch is every order between its first and last id, so one range on
+            # the primary key index of order_item finds their items whatever the number of orders
+            items = db.session.query(OrderItem.order_id, OrderItem.drink_id, OrderItem.drink_name,
+                                     OrderItem.quantity, OrderItem.unit_price) \
+                .filter(OrderItem.order_id.between(rows[0].id, rows[-1].id)) \
+                .order_by(OrderItem.order_id, OrderItem.drink_id) \
+                .all()
+            for item in items:
+                if item.order_id in items_by_order:
+                    items_by_order[item.order_id].append(item)
+        return [serialize_order(row.id, row.total, items_by_order[row.id]) for row in rows]
+
+class DrinkSales(db.Model): #running totals per drink, updated by the order_analytics job of every new order
+    __tablename__ = "drink_sales"
+    drink_id = db.Column(db.Integer, primary_key=True) #no foreign key, the sales stay after a drink is deleted
+    drink_name = db.Column(db.String(120), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0, index=True) #top-N by revenue reads the index backwards
+
+    def __repr__(self):
+        return f'<DrinkSales {self.drink_name}>'
 
     def serialize(self):
-        return{
-            "id": self.id,
-            "drinks": [drink.serialize() for drink in self.drinks],
-            "total": self.get_total() 
+        return {
+            "drink_id": self.drink_id,
+            "name": self.drink_name,
+            "quantity": self.quantity,
+            "orders": self.orders,
+            "revenue": self.revenue
         }
 
-    
\ No newline at end of file
+class DailySales(db.Model): #running totals per day (UTC), updated by the order_analytics job of every new order
+    __tablename__ = "daily_sales"
+    day = db.Column(db.Date, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailySales {self.day}>'
+
+    def serialize(self):
+        return {
+            "day": self.day.isoformat(),
+            "orders": self.orders,
+            "revenue": self.revenue
+        }
+
+class IdempotencyKey(db.Model): #response of a POST sent with an Idempotency-Key header, replayed when the client retries
+    __tablename__ = "idempotency_key"
+    key = db.Column(db.String(255), primary_key=True) #the primary key makes concurrent duplicates wait and then fail, no race
+    request_hash = db.Column(db.String(64), nullable=False) #sha256 of the body, the same key with another body is an error
+    status_code = db.Column(db.Integer, nullable=False)
+    response_body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True) #expired keys are purged by date
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key}>'
+
+class Job(db.Model): #background work saved in the same transaction as the request that needs it, run by jobs.py
+    __tablename__ = "job"
+    __table_args__ = (db.Index("ix_job_status_run_at", "status", "run_at"),) #the claim query: pending jobs that are due
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False) #name of the handler
+    payload = db.Column(db.Text, nullable=False) #json
+    status = db.Column(db.String(20), nullable=False, default="pending") #pending, running, done or failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=utcnow) #not before this time, moved forward by the retry backoff
+    locked_at = db.Column(db.DateTime, nullable=True) #when a worker claimed it, a stale lock means the worker died
+    locked_by = db.Column(db.String(100), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+class TableVersion(db.Model): #one row per table, its version goes up on every write, used to build ETags without reading the table
+    __tablename__ = "table_version"
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<TableVersion {self.name} {self.version}>'
+
+    @classmethod
+    def current(cls, names): #{name: TableVersion} in one query
+        return {row.name: row for row in cls.query.filter(cls.name.in_(names)).all()}
+
+    @classmethod
+    def bump(cls, names, connection): #one upsert, two first writers of a table do not race on the insert
+        from bulk import upsert_statement #bulk imports the models
+        now = utcnow().replace(microsecond=0)
+        connection.execute(
+            upsert_statement(cls.__table__, ["name"], ["updated_at"], ["version"], dialect=connection.dialect.name),
+            [{"name": name, "version": 1, "updated_at": now} for name in sorted(names)] #always the same order, no deadlocks
+        )
+
+    @staticmethod
+    def bump_after_commit(session, names): #the versions go up once the current transaction of session commits
+        session.info.setdefault("changed_tables", set()).update(names)
+
+# changing a row of the key table changes the responses of the listed tables
+VERSIONED_TABLES = {
+    "user": ("user",),
+    "drink": ("drink",),
+    "order": ("order",)
+}
+
+@event.listens_for(Session, "after_flush")
+def collect_changed_tables(session, flush_context): #API and admin writes alike
+    names = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        names.update(VERSIONED_TABLES.get(getattr(obj, "__tablename__", None), ()))
+    if names:
+        TableVersion.bump_after_commit(session, names)
+
+@event.listens_for(Session, "after_commit")
+def bump_table_versions(session):
+    # in a short transaction of its own: the table_version row is locked for one statement instead of the whole
+    # write, so concurrent orders do not queue on it; an ETag can lag the data for that moment, which is harmless
+    names = session.info.pop("changed_tables", None)
+    if names:
+        with session.get_bind().begin() as connection:
+            TableVersion.bump(names, connection)
+
+@event.listens_for(Session, "after_rollback")
+def forget_changed_tables(session):
+    session.info.pop("changed_tables", None)
@@ -0,0 +1,151 @@
+"""
+Per-client rate limiting and load shedding of the write endpoints.
+Every client (X-API-Key header, or the IP address) has a token bucket of `burst` requests refilled at `rate`
+per second; an empty bucket answers 429. Independently, each process serves at most `max_concurrent` writes at a
+time (about the size of its database pool), the rest are answered 503 right away instead of queueing for a
+connection. Both answers carry Retry-After.
+
+The bucket is stored as the time it becomes full again (GCRA), one number per client: in memory by default
+(each worker limits on its own) or in redis with RATELIMIT_REDIS_URL so all workers share the limit.
+"""
+import hashlib
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+from functools import wraps
+from flask import current_app, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+MAX_KEYS = 100000 #clients remembered by the memory backend, full buckets are dropped first
+EVICT_FRACTION = 0.1 #when no bucket is full, this share of max_keys (the fullest buckets) is dropped at once
+
+class MemoryBackend: #buckets of the current process only
+    def __init__(self, max_keys=MAX_KEYS, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._full_at = {} #key: monotonic time when the bucket is full again
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst): #(allowed, seconds until a token is available)
+        now = self.clock()
+        interval = 1 / rate
+        with self._lock:
+            full_at = max(self._full_at.get(key, now), now) + interval
+            wait = full_at - burst * interval - now
+            if wait > 0:
+                return False, wait
+            if len(self._full_at) >= self.max_keys and key not in self._full_at:
+                self._evict(now)
+            self._full_at[key] = full_at
+            return True, 0
+
+    def _evict(self, now):
+        # a full bucket is the same as a missing one, those go first; if that is not enough the buckets that are
+        # closest to full are forgotten (their clients get a few extra requests), a batch at a time so this stays rare
+        self._full_at = {k: v for k, v in self._full_at.items() if v > now}
+        if len(self._full_at) >= self.max_keys:
+            keep = max(0, self.max_keys - max(1, int(self.max_keys * EVICT_FRACTION)))
+            self._full_at = dict(heapq.nlargest(keep, self._full_at.items(), key=lambda item: item[1]))
+
+class RedisBackend: #buckets shared by every worker and instance, one round-trip per request
+    SCRIPT = """
+    local time = redis.call('TIME')
+    local now = tonumber(time[1]) * 1000 + tonumber(time[2]) / 1000
+    local interval = 1000 / tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local full_at = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now) + interval
+    local wait = full_at - burst * interval - now
+    if wait > 0 then
+        return {0, tostring(wait)}
+    end
+    redis.call('SET', KEYS[1], tostring(full_at), 'PX', math.max(1, math.ceil(full_at - now)))
+    return {1, '0'}
+    """ #milliseconds, the clock of the redis server is the same for every worker
+
+    def __init__(self, client, prefix="ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT) #EVALSHA, the script is sent once
+        import redis
+        self._errors = redis.RedisError
+
+    def take(self, key, rate, burst):
+        try:
+            allowed, wait = self._script(keys=[self.prefix + key], args=[rate, burst])
+        except self._errors as error: #the limiter must not take the API down with it
+            logger.warning("rate limit backend unavailable, request allowed: %s", error)
+            return True, 0
+        return bool(allowed), float(wait) / 1000
+
+def backend_from_env():
+    url = os.getenv("RATELIMIT_REDIS_URL") #ej: redis://localhost:6379/1, if missing each worker keeps its own buckets
+    if url is None:
+        return MemoryBackend()
+    import redis #optional dependency, only needed for the shared backend
+    return RedisBackend(redis.Redis.from_url(url, socket_timeout=0.1))
+
+class RateLimiter:
+    def __init__(self, backend=None, rate=5.0, burst=20, max_concurrent=15, enabled=True):
+        self.backend = backend or MemoryBackend()
+        self.rate = rate #requests per second per client, refill of the bucket
+        self.burst = burst #requests a client can make at once after being idle
+        self.max_concurrent = max_concurrent #writes in progress at the same time in this process
+        self.enabled = enabled
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    @classmethod
+    def from_env(cls):
+        pool = int(os.getenv("DB_POOL_SIZE", 5)) + int(os.getenv("DB_MAX_OVERFLOW", 10))
+        return cls(
+            backend=backend_from_env(),
+            rate=float(os.getenv("RATELIMIT_RATE", 5)),
+            burst=int(os.getenv("RATELIMIT_BURST", 20)),
+            max_concurrent=int(os.getenv("RATELIMIT_MAX_CONCURRENT", pool)),
+            enabled=os.getenv("RATELIMIT_ENABLED", "1") == "1"
+        )
+
+    def try_acquire(self): #a slot of the concurrency limit, False when all are taken
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+def client_key():
+    # the API key when the client sends one (hashed, it is a secret), otherwise the address of the connection;
+    # behind a proxy wrap the app in werkzeug's ProxyFix so remote_addr is the real client
+    api_key = request.headers.get("X-API-Key")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:32]
+    return "ip:" + (request.remote_addr or "unknown")
+
+def too_many(message, status_code, retry_after):
+    response = jsonify({"msg": message})
+    response.status_code = status_code
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def rate_limited(scope, rate=None, burst=None, methods=WRITE_METHODS):
+    # decorator for a view: token bucket per client and scope, then a slot of the concurrency limit while it runs,
+    # rate and burst default to the RateLimiter ones (RATELIMIT_RATE / RATELIMIT_BURST)
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limiter = current_app.extensions["rate_limiter"]
+            if not limiter.enabled or request.method not in methods:
+                return view(*args, **kwargs)
+            allowed, wait = limiter.backend.take(f"{scope}:{client_key()}", rate or limiter.rate, burst or limiter.burst)
+            if not allowed:
+                return too_many("too many requests, slow down", 429, wait)
+            if not limiter.try_acquire():
+                return too_many("server busy, try again", 503, 1)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                limiter.release()
+        return wrapper
+    return decorator
@@ -0,0 +1,316 @@
+"""
+The endpoints and CLI commands of the API, registered on the app by create_app() in app.py
+"""
+import os
+from datetime import date, timedelta
+import signal
+import threading
+import time
+from collections import Counter
+import click
+from flask import Blueprint, current_app, request, jsonify, Response, stream_with_context
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from utils import APIException, sitemap_response, list_response, conditional  #generates an index of all the endpoints of the application. 
+from models import db, utcnow, User, Drink, Order, OrderItem #db connection to sqlalchemy, could be changed for any other name.
+from bulk import FORMATS, iter_lines, import_drinks, export_drinks #CSV/NDJSON import and export of the menu
+import analytics #sales totals kept up to date by POST /orders
+import jobs #background work saved in the job table
+import idempotency #Idempotency-Key header of POST /orders
+from ratelimit import rate_limited #per client token bucket and concurrency limit of the writes
+from serialization import rows_as_dicts #orjson based JSON encoding
+
+api = Blueprint("api", __name__, cli_group=None) #cli_group=None keeps the commands at the top level: flask import-drinks
+
+def drink_catalog(): #the DrinkCatalog of the current app, created by create_app()
+    return current_app.extensions["drink_catalog"]
+
+# Handle/serialize errors like a JSON object
+@api.app_errorhandler(APIException)
+def handle_invalid_usage(error):
+    return jsonify(error.to_dict()), error.status_code #Defines an error handler for instances of APIException, returning JSON-formatted error responses.
+
+# generate sitemap with all your endpoints
+@api.route('/')
+def sitemap():
+    return sitemap_response("html") #Defines a route / that returns a sitemap of all endpoints in the application.
+
+# the same index for programs: browsable links and every route with its methods
+@api.route('/sitemap.json', methods=['GET'])
+def sitemap_json():
+    return sitemap_response("json")
+
+# API description built from the YAML in the docstrings of the views, flask_swagger is only imported when this is requested
+@api.route('/swagger.json', methods=['GET'])
+def swagger_spec():
+    from flask_swagger import swagger
+    spec = swagger(current_app)
+    spec["info"] = {"title": "4Geeks API", "version": "1.0"}
+    return jsonify(spec), 200
+
+# health check for the load balancer: database round-trip latency and connection pool usage of this worker
+@api.route('/healthz', methods=['GET'])
+def healthz():
+    result = {"status": "ok"}
+    started = time.perf_counter()
+    try:
+        db.session.execute(text("SELECT 1"))
+    except SQLAlchemyError as error:
+        db.session.rollback()
+        result["status"] = "error"
+        result["db_error"] = error.__class__.__name__
+    result["db_latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    pool = db.engine.pool
+    result["pool"] = {"class": pool.__class__.__name__}
+    for stat in ("size", "checkedin", "checkedout", "overflow"): #not every pool class (ej: sqlite) has all of them
+        if hasattr(pool, stat):
+            result["pool"][stat] = getattr(pool, stat)()
+
+    response = jsonify(result)
+    response.cache_control.no_store = True
+    return response, 200 if result["status"] == "ok" else 503
+
+@api.route('/user', methods=['GET'])
+@conditional("user")
+def handle_hello():
+
+    #SELECT * from users AND returns python objects, we can only jsonify dictionaries 
+    #supports ?limit=&after= pagination and ?stream=json|ndjson
+    return list_response(User.listing(), User.id, rows_as_dicts) #column rows straight to dicts, same keys as User.serialize
+
+@api.route('/drink', methods=['POST', "GET"])
+@rate_limited("drink")
+@conditional("drink")
+def add_drink():
+    
+    if request.method == "GET":
+        if not request.args: #the full menu comes from the catalog cache
+            return jsonify(drink_catalog().all()), 200
+        return list_response(Drink.listing(), Drink.id, rows_as_dicts)
+
+    body = request.json
+    #receive from body of request
+    name = body.get("name")
+    price = body.get("price")
+
+    if name != None and price != None: #if properties not None, create new instance of Class Drink(which is a row in the table)
+        new_drink = Drink(name=name, price=price) #constructor 
+        db.session.add(new_drink) #RAM
+        db.session.commit() #ID, al guardar en base de datos, se asigna ID automatico 
+        drink_catalog().invalidate()
+        return jsonify(new_drink.serialize()), 200
+    return jsonify({"msg": "Error missing keys"}), 400
+
+@api.route('/drink/<int:id>', methods=['DELETE', "PUT"])
+@rate_limited("drink")
+def handle_drink(id):
+    search = Drink.query.filter_by(id=id).one_or_none() #si encuentra lo devuelve y si no devuelve None
+
+    if request.method == "PUT":
+        if search != None:
+            body = request.json
+            new_name = body.get("name",None)
+            new_price = body.get("price", None)
+            if new_name != None:
+                search.name = new_name
+            if new_price != None:
+                search.price = new_price
+            db.session.commit()
+            drink_catalog().invalidate()
+            return jsonify(search.serialize()), 200
+        
+        return jsonify({"msg": "drink not found"}), 404
+    else:
+        if search != None:            
+            db.session.delete(search)
+            db.session.commit()
+            drink_catalog().invalidate()
+            return jsonify({"msg": "ey lo lograste, borraste exitoso"}),200
+
+        else:
+            return jsonify({"msg": "drink not found"}),404
+
+    return jsonify({"msg": "something happended"}),500
+
+@api.route('/drink/bulk', methods=['POST'])
+@rate_limited("drink_bulk", rate=0.2, burst=2) #one import every 5 seconds per client
+def bulk_import_drinks():
+    # body: CSV (text/csv) or NDJSON (application/x-ndjson), upserts by name, read line by line from the request stream
+    fmt = request.args.get("format") or ("csv" if request.mimetype == "text/csv" else "ndjson")
+    if fmt not in FORMATS:
+        return jsonify({"msg": "format must be csv or ndjson"}), 400
+    result = import_drinks(iter_lines(request.stream), fmt)
+    drink_catalog().invalidate()
+    return jsonify(result), 200 if result["error_count"] == 0 else 207
+
+@api.route('/drink/export', methods=['GET'])
+def bulk_export_drinks():
+    fmt = request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        return jsonify({"msg": "format must be csv or ndjson"}), 400
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(stream_with_context(export_drinks(fmt)), mimetype=mimetype)
+
+@api.cli.command("import-drinks")
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default=None, help="defaults to the file extension")
+def import_drinks_command(file, fmt):
+    """Upsert drinks from a CSV (name,price) or NDJSON file, - reads from stdin"""
+    fmt = fmt or ("csv" if file.name.endswith(".csv") else "ndjson")
+    result = import_drinks(file, fmt)
+    drink_catalog().invalidate()
+    click.echo(f"{result['upserted']} drinks upserted, {result['error_count']} errors")
+    for error in result["errors"]:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+
+@api.cli.command("export-drinks")
+@click.argument("file", type=click.File("w", encoding="utf-8"), default="-")
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default="csv")
+def export_drinks_command(file, fmt):
+    """Write the whole drink menu as CSV or NDJSON, - writes to stdout"""
+    for chunk in export_drinks(fmt):
+        file.write(chunk)
+
+@api.route('/drink/cache', methods=['GET'])
+def drink_cache_stats():
+    return jsonify(drink_catalog().stats()), 200 #hit/miss counters of the catalog cache
+
+@api.route("/orders", methods=['GET'])
+@conditional("order")
+def get_orders():
+    #orders + items in a constant number of column queries per page/batch, the total is a column
+    return list_response(Order.listing(), Order.id, Order.serialize_rows)
+
+@api.route("/orders", methods=['POST'])
+@rate_limited("orders")
+def add_order():
+    # un reintento con el mismo Idempotency-Key recibe la respuesta guardada sin volver a crear la orden
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key is not None:
+        if not 0 < len(idempotency_key) <= idempotency.MAX_KEY_LENGTH:
+            return jsonify({"msg": "invalid Idempotency-Key"}), 400
+        body_hash = idempotency.request_hash(request.get_json(silent=True))
+        replayed = idempotency.replay(idempotency_key, body_hash)
+        if replayed is not None:
+            return replayed
+
+    body = request.json
+    order_name = body.get("name")
+    drinks_ids = body.get("drinks") #ids que vienen, se pueden repetir (2 veces la misma bebida)
+
+    if not isinstance(drinks_ids, list):
+        return jsonify({"msg": "Error missing keys"}), 400
+    # solo ids enteros (true/false tambien son int en python), una lista u objeto adentro no se puede buscar
+    if not all(isinstance(drink_id, int) and not isinstance(drink_id, bool) for drink_id in drinks_ids):
+        return jsonify({"msg": "drinks must be a list of drink ids"}), 400
+
+    # las bebidas salen del catalogo en memoria (o de un solo SELECT ... WHERE id IN (...) si no esta en cache)
+    drinks_by_id = drink_catalog().get_many(drinks_ids)
+
+    # si falta alguna bebida se regresan TODOS los ids que no existen en un solo error
+    missing = sorted({drink_id for drink_id in drinks_ids if drink_id not in drinks_by_id})
+    if missing:
+        return jsonify({"msg": "drink not found", "missing": missing}), 404
+
+    # la llave se guarda antes de crear la orden, un duplicado concurrente espera aqui y luego recibe la respuesta del primero
+    idempotency_record = None
+    if idempotency_key is not None:
+        idempotency_record, replayed = idempotency.reserve(idempotency_key, body_hash)
+        if replayed is not None:
+            return replayed
+
+    # cantidad por bebida, en el orden en que llegaron los ids
+    quantities = Counter(drinks_ids)
+
+    new_order = Order(order_name) #objeto solo con nombre que viene del body
+    # nombre y precio se copian a la linea de la orden, si luego cambia el precio de la bebida la orden no cambia
+    new_order.items = [
+        OrderItem(drink_id=drink_id, drink_name=drinks_by_id[drink_id]["name"],
+                  quantity=quantity, unit_price=drinks_by_id[drink_id]["price"])
+        for drink_id, quantity in quantities.items()
+    ]
+    new_order.total = sum(item.unit_price * item.quantity for item in new_order.items)
+    db.session.add(new_order) #por la clase de la variable se sabe a que tabla ingresar
+    db.session.flush() #un INSERT de la orden y uno solo (executemany) para todas sus lineas
+    # el trabajo posterior (totales de analytics) queda en la tabla job en la misma transaccion, lo corre un worker
+    jobs.enqueue("order_analytics", order_id=new_order.id)
+
+    # la respuesta se arma antes del commit, despues del commit los objetos expiran y se volverian a consultar
+    result = new_order.serialize()
+    if idempotency_record is not None:
+        idempotency.save(idempotency_record, result, 201)
+    db.session.commit()
+    jobs.notify(current_app)
+
+    return jsonify(result), 201
+
+@api.route("/analytics/drinks", methods=['GET'])
+def analytics_drinks():
+    # ?top=<n> best selling drinks, ?by=revenue|quantity
+    by = request.args.get("by", "revenue")
+    try:
+        top = int(request.args.get("top", 10))
+    except ValueError:
+        raise APIException("top must be an integer", status_code=400)
+    if by not in ("revenue", "quantity") or not 0 < top <= analytics.MAX_TOP:
+        raise APIException(f"by must be revenue or quantity and top between 1 and {analytics.MAX_TOP}", status_code=400)
+    return jsonify(analytics.top_drinks(top, by)), 200
+
+@api.route("/analytics/daily", methods=['GET'])
+def analytics_daily():
+    # orders and revenue per day, ?from=YYYY-MM-DD&to=YYYY-MM-DD (both optional and included)
+    try:
+        start = date.fromisoformat(request.args["from"]) if "from" in request.args else None
+        end = date.fromisoformat(request.args["to"]) if "to" in request.args else None
+    except ValueError:
+        raise APIException("from and to must be dates like 2024-01-31", status_code=400)
+    return jsonify(analytics.daily_sales(start, end)), 200
+
+@api.cli.command("purge-idempotency-keys")
+def purge_idempotency_keys_command():
+    """Delete the expired Idempotency-Key responses"""
+    deleted = idempotency.purge_expired()
+    db.session.commit()
+    click.echo(f"{deleted} expired idempotency keys deleted")
+
+@api.cli.command("run-worker")
+@click.option("--workers", type=int, default=1, help="threads claiming jobs")
+@click.option("--batch-size", type=int, default=jobs.BATCH_SIZE)
+@click.option("--poll-interval", type=float, default=1.0, help="seconds between checks when there is nothing to do")
+@click.option("--burst", is_flag=True, help="run the jobs that are due and exit")
+def run_worker_command(workers, batch_size, poll_interval, burst):
+    """Run the background jobs, until stopped (Ctrl+C, SIGTERM) or with --burst until none is due"""
+    if burst:
+        total = 0
+        while True:
+            done = jobs.work(f"{os.getpid()}-burst", batch_size)
+            if not done:
+                break
+            total += done
+        click.echo(f"{total} jobs run")
+        return
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set()) #finish the current jobs before exiting
+    pool = jobs.WorkerPool(current_app._get_current_object(), workers, batch_size, poll_interval)
+    pool.start()
+    click.echo(f"{workers} job workers started")
+    try:
+        stopping.wait()
+    except KeyboardInterrupt:
+        pass
+    pool.stop()
+
+@api.cli.command("purge-jobs")
+@click.option("--days", type=int, default=7, help="keep the jobs finished in the last days")
+def purge_jobs_command(days):
+    """Delete the finished background jobs, failed ones are kept"""
+    deleted = jobs.purge_finished(utcnow() - timedelta(days=days))
+    db.session.commit()
+    click.echo(f"{deleted} finished jobs deleted")
+
+@api.cli.command("rebuild-analytics")
+def rebuild_analytics_command():
+    """Recompute the sales analytics tables from all the orders"""
+    result = analytics.rebuild()
+    click.echo(f"analytics rebuilt: {result['drinks']} drinks, {result['days']} days")
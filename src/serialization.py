@@ -0,0 +1,31 @@
+"""
+Faster JSON for the API responses.
+FastJSONProvider encodes with orjson when it is installed (several times faster than the json module on big lists)
+and falls back to Flask's default provider when it is not.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError: #optional dependency
+    orjson = None
+
+class FastJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        # orjson has no indent/separators options (used when the app is in debug mode), those go to the json module
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        # dates and dataclasses go through DefaultJSONProvider.default so the output is the same as with jsonify
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+def rows_as_dicts(rows):
+    # serializes the rows of a column query (db.session.query(Model.a, Model.b)), the keys are the column names
+    return [row._asdict() for row in rows]
@@ -1,4 +1,10 @@
-from flask import jsonify, url_for
+import zlib
+from functools import wraps
+from flask import g, jsonify, url_for, request, current_app, Response, stream_with_context, make_response
+from models import TableVersion
+
+MAX_PAGE_SIZE = 1000 #biggest page a client can ask for with ?limit=
+STREAM_BATCH_SIZE = 500 #rows fetched from the database per round-trip while streaming
 
 class APIException(Exception):
     status_code = 400
@@ -15,23 +21,150 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def get_page_args():
+    # ?limit=<n>&after=<id> keyset (cursor) pagination, both optional
+    limit = request.args.get("limit")
+    after = request.args.get("after")
+    try:
+        limit = int(limit) if limit is not None else None
+        after = int(after) if after is not None else None
+    except ValueError:
+        raise APIException("limit and after must be integers", status_code=400)
+    if limit is not None and not 0 < limit <= MAX_PAGE_SIZE:
+        raise APIException(f"limit must be between 1 and {MAX_PAGE_SIZE}", status_code=400)
+    return limit, after
+
+def keyset_page(query, column, after, limit):
+    # WHERE id > after ORDER BY id LIMIT n uses the primary key index, no OFFSET scan
+    if after is not None:
+        query = query.filter(column > after)
+    rows = query.order_by(column).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+def iter_keyset(query, column, batch_size=STREAM_BATCH_SIZE):
+    # walks the whole table one page at a time so only one batch is in memory
+    after = None
+    while True:
+        rows, has_more = keyset_page(query, column, after, batch_size)
+        if rows:
+            yield rows
+            after = getattr(rows[-1], column.key)
+        if not has_more:
+            return
+
+def stream_json(batches, serialize_batch, fmt="json"):
+    # yields a JSON array (or one JSON document per line for ndjson) chunk by chunk
+    dumps = current_app.json.dumps
+    db_session = current_app.extensions["sqlalchemy"].session
+
+    def generate():
+        first = True
+        if fmt == "json":
+            yield "["
+        for rows in batches:
+            items = serialize_batch(rows)
+            db_session.expunge_all() #releases the ORM objects of the batch already sent
+            if fmt == "ndjson":
+                yield "".join(dumps(item) + "\n" for item in items)
+                continue
+            if items:
+                yield ("" if first else ",") + ",".join(dumps(item) for item in items)
+                first = False
+        if fmt == "json":
+            yield "]"
+
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+def list_response(query, column, serialize_batch):
+    # shared by the collection endpoints:
+    #   ?stream=json|ndjson  streams the whole table in batches
+    #   ?limit=&after=       returns one page and the next cursor in the X-Next-Cursor/Link headers
+    #   (nothing)            returns the full list like before
+    fmt = request.args.get("stream")
+    if fmt is not None:
+        if fmt not in ("json", "ndjson"):
+            raise APIException("stream must be json or ndjson", status_code=400)
+        return stream_json(iter_keyset(query, column), serialize_batch, fmt)
+
+    limit, after = get_page_args()
+    if limit is None and after is None:
+        return jsonify(serialize_batch(query.order_by(column).all())), 200
+
+    rows, has_more = keyset_page(query, column, after, limit or MAX_PAGE_SIZE)
+    response = jsonify(serialize_batch(rows))
+    if has_more:
+        next_after = getattr(rows[-1], column.key)
+        response.headers["X-Next-Cursor"] = str(next_after)
+        response.headers["Link"] = '<%s>; rel="next"' % url_for(
+            request.endpoint, **request.view_args, limit=limit or MAX_PAGE_SIZE, after=next_after)
+    return response, 200
+
+def version_etag(endpoint, tables, versions, query_string):
+    # (etag, last modified) of a response that depends on tables, versions is {name: TableVersion}
+    tag = "-".join(f"{name}.{versions[name].version}" if name in versions else f"{name}.0" for name in tables)
+    etag = f"{endpoint}-{tag}-{zlib.crc32(query_string):08x}" #pages/streams of the same table differ
+    updated = [row.updated_at for row in versions.values()]
+    return etag, max(updated) if updated else None
+
+def conditional(*tables):
+    # strong ETag + Last-Modified built from the table_version rows of the tables the response depends on,
+    # an unchanged poll with If-None-Match/If-Modified-Since gets a 304 without running the query or serializing
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(*args, **kwargs)
+
+            versions = TableVersion.current(tables)
+            g.table_versions = {name: versions[name].version if name in versions else 0 for name in tables} #the drink catalog uses the same version
+            etag, last_modified = version_etag(request.endpoint, tables, versions, request.query_string)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = last_modified is not None and request.if_modified_since is not None \
+                    and last_modified <= request.if_modified_since.replace(tzinfo=None)
+
+            if not_modified:
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True #clients must revalidate, a 304 is cheap
+            return response
+        return wrapper
+    return decorator
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
-def generate_sitemap(app):
-    links = ['/admin/']
-    for rule in app.url_map.iter_rules():
+SITEMAP_MAX_AGE = 300 #seconds clients and proxies may reuse the sitemap without asking again
+
+def build_sitemap(app):
+    # route index built once per app, on the first request to / or /sitemap.json (the routes can not change
+    # after the first request); links are the pages a browser can open, routes every endpoint with its methods
+    links = ['/admin/'] if app.config.get("ADMIN_ENABLED") else []
+    routes = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.endpoint == "static":
+            continue
+        routes.append({"path": rule.rule, "methods": sorted(rule.methods - {"HEAD", "OPTIONS"}), "endpoint": rule.endpoint})
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
         if "GET" in rule.methods and has_no_empty_params(rule):
             url = url_for(rule.endpoint, **(rule.defaults or {}))
-            if "/admin/" not in url:
+            if "/admin/" not in url: #flask-admin pages, only its index is listed
                 links.append(url)
 
     links_html = "".join(["<li><a href='" + y + "'>" + y + "</a></li>" for y in links])
-    return """
+    html = """
         <div style="text-align: center;">
         <img style="max-height: 80px" src='https://storage.googleapis.com/breathecode/boilerplates/rigo-baby.jpeg' />
         <h1>Rigo welcomes you to your API!!</h1>
@@ -39,3 +172,21 @@ def generate_sitemap(app):
         <p>Start working on your proyect by following the <a href="https://start.4geeksacademy.com/starters/flask" target="_blank">Quick Start</a></p>
         <p>Remember to specify a real endpoint path like: </p>
         <ul style="text-align: left;">"""+links_html+"</ul></div>"
+    body = app.json.dumps({"links": links, "routes": routes})
+    return {
+        "html": (html, f"{zlib.crc32(html.encode()):08x}"),
+        "json": (body, f"{zlib.crc32(body.encode()):08x}")
+    }
+
+def sitemap_response(fmt): #fmt is html or json, the body comes from the precomputed index
+    sitemap = current_app.extensions.get("sitemap")
+    if sitemap is None:
+        sitemap = current_app.extensions["sitemap"] = build_sitemap(current_app)
+    body, etag = sitemap[fmt]
+    response = Response(body, mimetype="text/html" if fmt == "html" else "application/json")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = SITEMAP_MAX_AGE
+    if fmt == "html":
+        response.headers["Link"] = '</sitemap.json>; rel="alternate"; type="application/json"'
+    return response.make_conditional(request)
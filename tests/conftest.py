@@ -0,0 +1,47 @@
+import pytest
+from sqlalchemy import event
+from app import create_app
+from models import db, Drink, Order, OrderItem
+
+@pytest.fixture
+def app(monkeypatch):
+    # in-memory SQLite (one shared connection), no background threads, no rate limit
+    monkeypatch.setenv("JOB_WORKERS", "0")
+    monkeypatch.setenv("RATELIMIT_ENABLED", "0")
+    monkeypatch.delenv("PROFILING_ENABLED", raising=False)
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite://", "SQLALCHEMY_ENGINE_OPTIONS": {}})
+    with app.app_context():
+        db.create_all()
+    yield app #requests push their own app context, like in production (g and the session do not leak between them)
+    with app.app_context():
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def statements(app): #SQL statements sent to the database while the test runs
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+def add_orders(count, drinks_per_order=3): #count orders with drinks_per_order lines each, straight to the database (inside an app context)
+    drinks = [Drink.query.filter_by(name=f"drink {i}").one_or_none() or Drink(name=f"drink {i}", price=i + 1.5)
+              for i in range(drinks_per_order)]
+    db.session.add_all(drinks)
+    db.session.flush()
+    for number in range(count):
+        order = Order(f"order {number}")
+        order.items = [OrderItem(drink_id=drink.id, drink_name=drink.name, quantity=2, unit_price=drink.price) for drink in drinks]
+        order.total = sum(item.quantity * item.unit_price for item in order.items)
+        db.session.add(order)
+    db.session.commit()
+    return drinks
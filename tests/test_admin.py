@@ -0,0 +1,65 @@
+import re
+import pytest
+from sqlalchemy import event
+from admin import UserView, DrinkView, OrderView, FilterStartsWith
+from conftest import add_orders
+from models import db, User, Drink, Order, OrderItem
+
+def indexed(table, name): #the column leads an index (or is the primary key / unique)
+    column = table.c[name]
+    return column.primary_key or column.unique or any(index.columns[0] is column for index in table.indexes)
+
+@pytest.mark.parametrize("view, model", [(UserView, User), (DrinkView, Drink), (OrderView, Order)])
+def test_admin_sorts_and_filters_only_on_indexed_columns(view, model):
+    filters = [name if isinstance(name, str) else name.column.key for name in view.column_filters]
+    columns = set(view.column_sortable_list) | set(filters) | set(view.column_searchable_list)
+    assert [name for name in columns if not indexed(model.__table__, name)] == []
+
+@pytest.fixture
+def order_plans(app): #EXPLAIN QUERY PLAN of every statement on the order table sent while the test runs
+    plans = []
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM "order"' in statement and not statement.startswith("EXPLAIN"):
+            plans.append([row[-1] for row in cursor.connection.execute("EXPLAIN QUERY PLAN " + statement, parameters)])
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", explain)
+    yield plans
+    event.remove(engine, "before_cursor_execute", explain)
+
+def admin_view(app, model):
+    return next(view for view in app.extensions["admin"][0]._views if getattr(view, "model", None) is model)
+
+def test_admin_search_uses_the_index(app, client, order_plans):
+    with app.app_context():
+        add_orders(30)
+    response = client.get("/admin/order/?search=order+1")
+    assert response.status_code == 200
+    assert b"order 12" in response.data and b"order 2<" not in response.data
+    assert len(order_plans) == 2 #the page and the exact count
+    for plan in order_plans:
+        assert any(re.search(r"USING (COVERING )?INDEX ix_order_name \(name>\? AND name<\?\)", step) for step in plan), plan
+        assert not any(step.startswith('SCAN order') for step in plan), plan
+
+def test_admin_name_filter_uses_the_index(app, client, order_plans):
+    with app.app_context():
+        add_orders(30)
+    view = admin_view(app, Order)
+    index = next(i for i, flt in enumerate(view._filters) if isinstance(flt, FilterStartsWith))
+    response = client.get(f"/admin/order/?flt0_{index}=order+2")
+    assert response.status_code == 200
+    assert b"order 25" in response.data and b"order 12" not in response.data
+    assert order_plans
+    for plan in order_plans:
+        assert any(re.search(r"USING (COVERING )?INDEX ix_order_name \(name>\? AND name<\?\)", step) for step in plan), plan
+
+def test_admin_deletes_an_order_and_its_items(app, client):
+    with app.app_context():
+        add_orders(2)
+        order_id = Order.query.order_by(Order.id).first().id
+    response = client.post("/admin/order/delete/", data={"id": order_id, "url": "/admin/order/"})
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(Order, order_id) is None
+        assert OrderItem.query.filter_by(order_id=order_id).count() == 0
+        assert OrderItem.query.count() == 3 #the other order keeps its lines
@@ -0,0 +1,45 @@
+import analytics
+import jobs
+from models import Job
+
+def run_jobs(app):
+    with app.app_context():
+        while jobs.work("test"):
+            pass
+        return {job.status for job in Job.query.all()}
+
+def test_order_analytics_job(app, client):
+    drink_id = client.post("/drink", json={"name": "cola", "price": 1.5}).json["id"]
+    client.post("/orders", json={"name": "x", "drinks": [drink_id, drink_id]})
+    assert run_jobs(app) == {"done"}
+    assert client.get("/analytics/drinks").json == [
+        {"drink_id": drink_id, "name": "cola", "quantity": 2, "orders": 1, "revenue": 3.0}]
+    assert [day["orders"] for day in client.get("/analytics/daily").json] == [1]
+
+def test_empty_order_analytics_job(app, client):
+    assert client.post("/orders", json={"name": "nothing", "drinks": []}).status_code == 201
+    assert run_jobs(app) == {"done"}
+    assert client.get("/analytics/drinks").json == []
+    assert [(day["orders"], day["revenue"]) for day in client.get("/analytics/daily").json] == [(1, 0)]
+
+def daily_orders(client):
+    return sum(day["orders"] for day in client.get("/analytics/daily").json)
+
+def test_rebuild_does_not_count_orders_twice(app, client):
+    drink_id = client.post("/drink", json={"name": "cola", "price": 1.5}).json["id"]
+    client.post("/orders", json={"name": "done", "drinks": [drink_id]})
+    assert run_jobs(app) == {"done"}
+    client.post("/orders", json={"name": "pending", "drinks": [drink_id]})
+    client.post("/orders", json={"name": "running", "drinks": [drink_id]})
+    with app.app_context():
+        running = jobs.claim("test", batch_size=1)[0] #claimed before the rebuild, finishes after it
+        assert analytics.rebuild() == {"drinks": 1, "days": 1}
+        assert jobs.run(running)
+    assert run_jobs(app) == {"done"}
+    assert daily_orders(client) == 3
+    assert client.get("/analytics/drinks").json[0]["quantity"] == 3
+
+    client.post("/orders", json={"name": "after", "drinks": [drink_id, drink_id]}) #its job still counts it
+    run_jobs(app)
+    assert daily_orders(client) == 4
+    assert client.get("/analytics/drinks").json[0]["quantity"] == 5
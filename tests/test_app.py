@@ -0,0 +1,38 @@
+import os
+import click
+from click.testing import CliRunner
+from flask.cli import FlaskGroup
+from app import create_app
+from models import db
+
+CONFIG = {"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite://", "SQLALCHEMY_ENGINE_OPTIONS": {}}
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_admin_uses_the_api_engine(app, client, statements):
+    with app.app_context():
+        engine = db.engine
+    client.post("/drink", json={"name": "cola", "price": 1.5})
+    statements.clear()
+    response = client.get("/admin/drink/")
+    assert response.status_code == 200 and b"cola" in response.data
+    assert statements #the admin queries went through the engine (and pool) of the API
+    with app.app_context():
+        assert db.engine is engine
+
+def test_migrate_is_only_set_up_by_flask_db(monkeypatch):
+    monkeypatch.setenv("JOB_WORKERS", "0")
+    monkeypatch.chdir(ROOT) #the migrations directory
+    apps = []
+    def factory():
+        apps.append(create_app(CONFIG))
+        return apps[-1]
+
+    result = CliRunner().invoke(FlaskGroup(create_app=factory), ["db", "heads"])
+    assert result.exit_code == 0, result.output
+    assert "migrate" in apps[-1].extensions
+
+    @click.command() #like uvicorn, a click command that builds the app
+    def serve():
+        factory()
+    assert CliRunner().invoke(serve).exit_code == 0
+    assert "migrate" not in apps[-1].extensions
@@ -0,0 +1,30 @@
+import importlib
+import sys
+import pytest
+from starlette.testclient import TestClient
+from models import db
+
+@pytest.fixture
+def asgi(monkeypatch, tmp_path):
+    # asgi.py builds its app at import time, both engines open the same SQLite file
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/asgi.db")
+    monkeypatch.setenv("JOB_WORKERS", "0")
+    monkeypatch.setenv("RATELIMIT_ENABLED", "0")
+    monkeypatch.delenv("PROFILING_ENABLED", raising=False)
+    sys.modules.pop("asgi", None)
+    module = importlib.import_module("asgi")
+    with module.flask_app.app_context():
+        db.create_all()
+    yield module
+    sys.modules.pop("asgi", None)
+
+def test_async_lists_match_flask(asgi):
+    flask_client = asgi.flask_app.test_client()
+    flask_client.post("/drink", json={"name": "cola", "price": 1.5})
+    flask_client.post("/orders", json={"name": "x", "drinks": [1, 1]})
+    with TestClient(asgi.application) as client:
+        for path in ("/drink", "/orders", "/orders?limit=1"):
+            flask_response = flask_client.get(path)
+            asgi_response = client.get(path)
+            assert asgi_response.headers["ETag"] == flask_response.headers["ETag"]
+            assert asgi_response.content == flask_response.get_data()
@@ -0,0 +1,27 @@
+import pytest
+from types import SimpleNamespace
+import io
+from bulk import iter_lines, upsert_statement
+from models import db, Drink
+
+def test_upsert_statement_names_the_supported_dialects(app, monkeypatch):
+    with app.app_context():
+        monkeypatch.setattr(db.session, "get_bind", lambda: SimpleNamespace(dialect=SimpleNamespace(name="mssql")))
+        with pytest.raises(RuntimeError, match="mssql.*mysql, postgresql, sqlite"):
+            upsert_statement(Drink.__table__, ["name"], ["price"])
+
+def test_bulk_import_upserts(client):
+    body = "name,price\ncola,1.5\nwater,1\n"
+    assert client.post("/drink/bulk", data=body, content_type="text/csv").status_code == 200
+    assert client.post("/drink/bulk", data="name,price\ncola,2\n", content_type="text/csv").status_code == 200
+    assert {drink["name"]: drink["price"] for drink in client.get("/drink").json} == {"cola": 2.0, "water": 1.0}
+
+def test_ndjson_lines_end_only_at_newline(client):
+    body = '{"name": "cola\u2028light", "price": 1}\n{"name": "a\x85b", "price": 2}\r\nnot json\n{"name": "water", "price": 1}'
+    response = client.post("/drink/bulk", data=body.encode(), content_type="application/x-ndjson")
+    assert response.json["upserted"] == 3
+    assert [error["line"] for error in response.json["errors"]] == [3]
+
+def test_lines_cut_between_chunks():
+    body = '{"name": "cola "}\r\n{"name": "é"}\n'.encode()
+    assert list(iter_lines(io.BytesIO(body), chunk_size=3)) == ['{"name": "cola "}\r\n', '{"name": "é"}\n']
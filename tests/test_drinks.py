@@ -0,0 +1,28 @@
+from models import db, Drink
+
+def change_price_out_of_band(app, name, price): #like an admin edit or a write handled by another worker: no catalog.invalidate()
+    with app.app_context():
+        drink = Drink.query.filter_by(name=name).one()
+        drink.price = price
+        db.session.commit()
+
+def test_catalog_follows_writes_made_elsewhere(app, client):
+    client.post("/drink", json={"name": "cola", "price": 1.0})
+    first = client.get("/drink")
+    assert first.json[0]["price"] == 1.0
+    assert client.get("/drink").json[0]["price"] == 1.0 #served from the catalog
+
+    change_price_out_of_band(app, "cola", 2.0)
+    second = client.get("/drink")
+    assert second.json[0]["price"] == 2.0
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert client.get("/drink", headers={"If-None-Match": first.headers["ETag"]}).status_code == 200
+    assert client.get("/drink", headers={"If-None-Match": second.headers["ETag"]}).status_code == 304
+
+def test_orders_use_the_current_price(app, client):
+    response = client.post("/drink", json={"name": "cola", "price": 1.0})
+    drink_id = response.json["id"]
+    client.get("/drink") #fills the catalog
+    change_price_out_of_band(app, "cola", 3.0)
+    order = client.post("/orders", json={"name": "x", "drinks": [drink_id, drink_id]}).json
+    assert order["total"] == 6.0
@@ -0,0 +1,69 @@
+from datetime import timedelta
+from sqlalchemy.exc import IntegrityError
+import idempotency
+from models import db, utcnow, Order, IdempotencyKey
+
+def post_order(client, key, data, content_type="application/json"):
+    return client.post("/orders", data=data, content_type=content_type, headers={"Idempotency-Key": key})
+
+def orders_count(app):
+    with app.app_context():
+        return Order.query.count()
+
+def make_drink(client):
+    return client.post("/drink", json={"name": "cola", "price": 1.5}).json["id"]
+
+def test_retry_gets_the_saved_response(app, client):
+    drink_id = make_drink(client)
+    first = post_order(client, "k1", f'{{"name": "x", "drinks": [{drink_id}]}}')
+    assert first.status_code == 201 and "Idempotent-Replayed" not in first.headers
+    # same JSON serialized differently (key order, spaces)
+    retry = post_order(client, "k1", f'{{"drinks":[{drink_id}],"name":"x"}}')
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json == first.json
+    assert orders_count(app) == 1
+
+def test_same_key_with_another_body_is_rejected(app, client):
+    drink_id = make_drink(client)
+    assert post_order(client, "k1", f'{{"name": "x", "drinks": [{drink_id}]}}').status_code == 201
+    assert post_order(client, "k1", f'{{"name": "x", "drinks": [{drink_id}, {drink_id}]}}').status_code == 422
+    assert orders_count(app) == 1
+
+def test_expired_keys_do_the_work_again(app, client):
+    drink_id = make_drink(client)
+    body = f'{{"name": "x", "drinks": [{drink_id}]}}'
+    assert post_order(client, "k1", body).status_code == 201
+    with app.app_context():
+        db.session.get(IdempotencyKey, "k1").created_at = utcnow() - idempotency.ttl() - timedelta(seconds=1)
+        db.session.commit()
+    retry = post_order(client, "k1", body)
+    assert retry.status_code == 201 and "Idempotent-Replayed" not in retry.headers
+    assert orders_count(app) == 2
+
+def test_invalid_keys(client):
+    assert post_order(client, "", '{"drinks": []}').status_code == 400
+    assert post_order(client, "k" * 256, '{"drinks": []}').status_code == 400
+
+def test_concurrent_duplicate_replays_the_first_response(app, client, monkeypatch):
+    # the duplicate checked for the key before the first request committed, its INSERT then hits the primary key
+    drink_id = make_drink(client)
+    body = f'{{"name": "x", "drinks": [{drink_id}]}}'
+    first = post_order(client, "k1", body)
+    monkeypatch.setattr(idempotency, "replay", lambda key, body_hash: None)
+    duplicate = post_order(client, "k1", body)
+    assert duplicate.status_code == 201
+    assert duplicate.headers["Idempotent-Replayed"] == "true"
+    assert duplicate.json == first.json
+    assert orders_count(app) == 1
+
+def test_concurrent_duplicate_of_a_failed_request_gets_409(app, client, monkeypatch):
+    # the first request held the key and then rolled back: nothing to replay, the client retries later
+    drink_id = make_drink(client)
+    def flush(*args, **kwargs):
+        raise IntegrityError("INSERT INTO idempotency_key", {}, Exception("duplicate key"))
+    monkeypatch.setattr(db.session, "flush", flush)
+    response = post_order(client, "k1", f'{{"name": "x", "drinks": [{drink_id}]}}')
+    monkeypatch.undo()
+    assert response.status_code == 409
+    assert orders_count(app) == 0
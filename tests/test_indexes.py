@@ -0,0 +1,19 @@
+from sqlalchemy import select, text
+from models import db, OrderItem
+
+def query_plan(statement): #EXPLAIN QUERY PLAN of a select on SQLite, one string per step
+    sql = statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+def test_items_of_a_page_of_orders_use_the_primary_key(app):
+    # the selectinload(Order.items) query of GET /orders
+    with app.app_context():
+        plan = query_plan(select(OrderItem).where(OrderItem.order_id.in_([1, 2, 3])))
+    assert any("USING INDEX sqlite_autoindex_order_item_1 (order_id=?)" in step for step in plan), plan
+    assert not any(step.startswith("SCAN order_item") for step in plan), plan
+
+def test_orders_of_a_drink_use_the_drink_id_index(app):
+    with app.app_context():
+        plan = query_plan(select(OrderItem).where(OrderItem.drink_id == 1))
+    assert any("USING INDEX ix_order_item_drink_id (drink_id=?)" in step for step in plan), plan
+    assert not any(step.startswith("SCAN order_item") for step in plan), plan
@@ -0,0 +1,33 @@
+import pytest
+from flask import g
+from sqlalchemy import text
+from app import create_app
+from models import db
+
+@pytest.fixture
+def profiled_app(monkeypatch):
+    monkeypatch.setenv("JOB_WORKERS", "0")
+    monkeypatch.setenv("RATELIMIT_ENABLED", "0")
+    monkeypatch.setenv("PROFILING_ENABLED", "1")
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite://", "SQLALCHEMY_ENGINE_OPTIONS": {}})
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+def test_server_timing_counts_queries(profiled_app):
+    response = profiled_app.test_client().get("/orders")
+    assert response.status_code == 200
+    assert "queries" in response.headers["Server-Timing"]
+
+def test_failed_statements_leave_nothing_on_the_connection(profiled_app):
+    with profiled_app.test_request_context():
+        profiled_app.preprocess_request() #starts the profile
+        with db.engine.connect() as conn:
+            for _ in range(3):
+                with pytest.raises(Exception):
+                    conn.execute(text("SELECT * FROM missing_table"))
+            conn.execute(text("SELECT 1"))
+            assert "query_started" not in conn.info
+        assert g.profile["queries"] == 1
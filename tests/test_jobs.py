@@ -0,0 +1,82 @@
+from datetime import timedelta
+import pytest
+import jobs
+from models import db, utcnow, Job
+
+@pytest.fixture(params=[True, False], ids=["returning", "select-then-update"])
+def claim_path(request, app, monkeypatch): #both ways claim() marks the jobs: UPDATE ... RETURNING and SELECT + UPDATE
+    with app.app_context():
+        monkeypatch.setattr(db.engine.dialect, "update_returning", request.param)
+    return request.param
+
+@pytest.fixture
+def failing(monkeypatch):
+    calls = []
+    def fail(**payload):
+        calls.append(payload)
+        raise RuntimeError("boom")
+    monkeypatch.setitem(jobs.HANDLERS, "fail", fail)
+    return calls
+
+def enqueue(app, kind, **options):
+    with app.app_context():
+        job = jobs.enqueue(kind, **options)
+        db.session.commit()
+        return job.id
+
+def make_due(app, job_id):
+    with app.app_context():
+        db.session.get(Job, job_id).run_at = utcnow() - timedelta(seconds=1)
+        db.session.commit()
+
+def get_job(app, job_id):
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        db.session.expunge(job)
+        return job
+
+def test_failed_job_is_retried_with_backoff(app, claim_path, failing, monkeypatch):
+    delays = []
+    monkeypatch.setattr(jobs, "backoff", lambda attempts: delays.append(attempts) or 60)
+    job_id = enqueue(app, "fail", max_attempts=3, order_id=7)
+    with app.app_context():
+        claimed = jobs.claim("test")
+        assert [(job.id, job.attempts) for job in claimed] == [(job_id, 1)]
+        assert not jobs.run(claimed[0])
+    job = get_job(app, job_id)
+    assert (job.status, job.attempts, job.locked_at) == ("pending", 1, None)
+    assert "RuntimeError: boom" in job.last_error
+    assert job.run_at > utcnow() + timedelta(seconds=50)
+    assert delays == [1] #the first retry waits backoff(1)
+    with app.app_context():
+        assert jobs.work("test") == 0 #not due yet
+    assert failing == [{"order_id": 7}]
+
+def test_job_fails_after_max_attempts(app, claim_path, failing):
+    job_id = enqueue(app, "fail", max_attempts=3)
+    for attempt in range(1, 4):
+        make_due(app, job_id)
+        with app.app_context():
+            assert jobs.work("test") == 1
+        assert get_job(app, job_id).attempts == attempt
+    job = get_job(app, job_id)
+    assert job.status == "failed" and job.finished_at is not None
+    assert len(failing) == 3 #never more than max_attempts runs
+    make_due(app, job_id)
+    with app.app_context():
+        assert jobs.work("test") == 0
+
+def test_stale_lock_is_claimed_again(app, claim_path, monkeypatch):
+    runs = []
+    monkeypatch.setitem(jobs.HANDLERS, "ok", lambda: runs.append(1))
+    job_id = enqueue(app, "ok")
+    with app.app_context():
+        assert len(jobs.claim("dead worker")) == 1 #claimed, then the worker died
+        assert jobs.claim("other") == [] #locked, not stale yet
+        db.session.get(Job, job_id).locked_at = utcnow() - jobs.LOCK_TIMEOUT - timedelta(seconds=1)
+        db.session.commit()
+        claimed = jobs.claim("other")
+        assert [(job.id, job.attempts) for job in claimed] == [(job_id, 2)]
+        assert jobs.run(claimed[0])
+    job = get_job(app, job_id)
+    assert (job.status, job.locked_by) == ("done", "other") and runs == [1]
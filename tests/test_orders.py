@@ -0,0 +1,59 @@
+import pytest
+from conftest import add_orders
+from models import OrderItem
+
+def test_list_orders_statement_count_is_flat(app, client, statements):
+    counts = {}
+    for added, total in ((20, 20), (180, 200), (1000, 1200)): #1200 orders is past any chunk of ids
+        with app.app_context():
+            add_orders(added)
+        statements.clear()
+        response = client.get("/orders")
+        assert response.status_code == 200
+        assert len(response.json) == total
+        counts[total] = len(statements)
+    assert len(set(counts.values())) == 1, counts
+
+def test_order_pages_have_their_items(app, client):
+    with app.app_context():
+        add_orders(5, drinks_per_order=2)
+    page = client.get("/orders?limit=2&after=1").json
+    assert [order["id"] for order in page] == [2, 3]
+    assert all(len(order["items"]) == 2 for order in page)
+
+def test_list_orders_totals_and_items(app, client):
+    with app.app_context():
+        add_orders(2, drinks_per_order=2)
+    order = client.get("/orders").json[0]
+    assert order["total"] == 2 * 1.5 + 2 * 2.5
+    assert [item["quantity"] for item in order["items"]] == [2, 2]
+    assert len(order["drinks"]) == 4
+
+def test_empty_order_writes_no_items(app, client):
+    response = client.post("/orders", json={"name": "nothing", "drinks": []})
+    assert response.status_code == 201
+    assert response.json["items"] == [] and response.json["total"] == 0
+    with app.app_context():
+        assert OrderItem.query.count() == 0
+
+def test_repeated_drinks_add_up_to_the_quantity(app, client):
+    cola = client.post("/drink", json={"name": "cola", "price": 1.5}).json["id"]
+    water = client.post("/drink", json={"name": "water", "price": 1.0}).json["id"]
+    order = client.post("/orders", json={"name": "x", "drinks": [cola, water, cola, cola]}).json
+    assert [(item["drink_id"], item["quantity"]) for item in order["items"]] == [(cola, 3), (water, 1)]
+    assert order["total"] == 3 * 1.5 + 1.0
+    assert len(order["drinks"]) == 4
+
+def test_every_missing_drink_in_one_404(app, client):
+    cola = client.post("/drink", json={"name": "cola", "price": 1.5}).json["id"]
+    response = client.post("/orders", json={"name": "x", "drinks": [99, cola, 42, 99]})
+    assert response.status_code == 404
+    assert response.json["missing"] == [42, 99]
+    with app.app_context():
+        assert OrderItem.query.count() == 0
+
+@pytest.mark.parametrize("drinks", [None, 1, "1", [[1]], [{"id": 1}], ["1"], [1.0], [True]])
+def test_invalid_drink_ids_are_rejected(client, drinks):
+    client.post("/drink", json={"name": "cola", "price": 1.5})
+    response = client.post("/orders", json={"name": "x", "drinks": drinks})
+    assert response.status_code == 400
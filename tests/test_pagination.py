@@ -0,0 +1,58 @@
+import json
+import pytest
+from models import db, Drink
+import utils
+from utils import MAX_PAGE_SIZE
+
+@pytest.fixture
+def drinks(app): #25 drinks, ids 1..25
+    with app.app_context():
+        db.session.add_all([Drink(name=f"drink {number:02}", price=number) for number in range(1, 26)])
+        db.session.commit()
+    return list(range(1, 26))
+
+def test_pages_follow_the_cursor(client, drinks):
+    ids, url, pages = [], "/drink?limit=10", 0
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        ids += [drink["id"] for drink in response.json]
+        pages += 1
+        if "X-Next-Cursor" in response.headers:
+            assert response.headers["Link"] == f'</drink?limit=10&after={response.headers["X-Next-Cursor"]}>; rel="next"'
+            url = response.headers["Link"][1:response.headers["Link"].index(">")]
+        else:
+            assert "Link" not in response.headers
+            url = None
+    assert ids == drinks and pages == 3
+
+def test_after_without_limit_uses_the_biggest_page(client, drinks):
+    response = client.get("/drink?after=20")
+    assert [drink["id"] for drink in response.json] == [21, 22, 23, 24, 25]
+    assert "X-Next-Cursor" not in response.headers
+
+def test_exact_last_page_has_no_cursor(client, drinks):
+    response = client.get("/drink?limit=5&after=20")
+    assert len(response.json) == 5 and "X-Next-Cursor" not in response.headers
+
+@pytest.mark.parametrize("query", ["limit=0", f"limit={MAX_PAGE_SIZE + 1}", "limit=x", "after=x", "stream=xml"])
+def test_invalid_arguments(client, drinks, query):
+    response = client.get(f"/drink?{query}")
+    assert response.status_code == 400 and response.json["message"]
+
+def test_stream_json(client, drinks, monkeypatch):
+    monkeypatch.setattr(utils.iter_keyset, "__defaults__", (10,)) #three batches
+    response = client.get("/drink?stream=json")
+    assert response.mimetype == "application/json"
+    assert [drink["id"] for drink in json.loads(response.get_data())] == drinks
+
+def test_stream_ndjson(client, drinks):
+    response = client.get("/orders?stream=ndjson")
+    assert response.mimetype == "application/x-ndjson" and response.get_data() == b""
+    response = client.get("/drink?stream=ndjson")
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == drinks
+
+def test_stream_json_of_an_empty_table(client):
+    assert client.get("/user?stream=json").get_data() == b"[]"
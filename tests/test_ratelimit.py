@@ -0,0 +1,82 @@
+import fakeredis
+import pytest
+from app import create_app
+from models import db
+from ratelimit import MemoryBackend, RedisBackend
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_gcra_allows_a_burst_then_the_rate():
+    clock = Clock()
+    backend = MemoryBackend(clock=clock)
+    assert [backend.take("a", rate=2, burst=3)[0] for _ in range(3)] == [True] * 3
+    allowed, wait = backend.take("a", rate=2, burst=3)
+    assert not allowed and wait == pytest.approx(0.5)
+    assert backend.take("b", rate=2, burst=3) == (True, 0) #every client has its own bucket
+    clock.now += 0.5 #one token back
+    assert backend.take("a", rate=2, burst=3) == (True, 0)
+    assert not backend.take("a", rate=2, burst=3)[0]
+    clock.now += 10 #idle: the bucket is full again, not more than burst
+    assert [backend.take("a", rate=2, burst=3)[0] for _ in range(4)] == [True, True, True, False]
+
+def test_memory_backend_stays_bounded():
+    clock = Clock()
+    backend = MemoryBackend(max_keys=100, clock=clock)
+    for number in range(1000): #no bucket is ever full again, they all stay busy
+        assert backend.take(f"client {number}", rate=0.001, burst=5)[0]
+        assert len(backend._full_at) <= 100
+    clock.now += 10 ** 6 #all full again, dropped first
+    backend.take("new", rate=0.001, burst=5)
+    assert list(backend._full_at) == ["new"]
+
+def test_redis_backend_shares_the_bucket():
+    server = fakeredis.FakeServer()
+    workers = [RedisBackend(fakeredis.FakeRedis(server=server)) for _ in range(2)]
+    results = [workers[number % 2].take("a", rate=1, burst=3) for number in range(4)]
+    assert [allowed for allowed, wait in results] == [True, True, True, False]
+    assert 0 < results[-1][1] <= 1
+    assert workers[0].client.pttl("ratelimit:a") > 0 #the key expires once the bucket is full again
+
+def test_redis_backend_down_allows_requests():
+    backend = RedisBackend(fakeredis.FakeRedis())
+    backend.client.connected = False
+    assert backend.take("a", rate=1, burst=1) == (True, 0)
+
+@pytest.fixture
+def limited_app(monkeypatch):
+    monkeypatch.setenv("JOB_WORKERS", "0")
+    monkeypatch.setenv("RATELIMIT_ENABLED", "1")
+    monkeypatch.setenv("RATELIMIT_BURST", "2")
+    monkeypatch.setenv("RATELIMIT_RATE", "0.1")
+    monkeypatch.setenv("RATELIMIT_MAX_CONCURRENT", "1")
+    monkeypatch.delenv("RATELIMIT_REDIS_URL", raising=False)
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite://", "SQLALCHEMY_ENGINE_OPTIONS": {}})
+    with app.app_context():
+        db.create_all()
+    return app
+
+def test_429_with_retry_after(limited_app):
+    client = limited_app.test_client()
+    statuses = [client.post("/drink", json={"name": f"d{n}", "price": 1}).status_code for n in range(3)]
+    assert statuses == [200, 200, 429]
+    response = client.post("/drink", json={"name": "d3", "price": 1})
+    assert response.status_code == 429 and response.json["msg"]
+    assert 1 <= int(response.headers["Retry-After"]) <= 10
+    assert client.get("/drink").status_code == 200 #reads are not limited
+    other = client.post("/drink", json={"name": "d4", "price": 1}, headers={"X-API-Key": "secret"})
+    assert other.status_code == 200 #another client
+
+def test_503_when_every_slot_is_busy(limited_app):
+    limiter = limited_app.extensions["rate_limiter"]
+    assert limiter.try_acquire() #a write in progress
+    try:
+        response = limited_app.test_client().post("/drink", json={"name": "cola", "price": 1})
+    finally:
+        limiter.release()
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+    assert limited_app.test_client().post("/drink", json={"name": "cola", "price": 1}).status_code == 200
@@ -0,0 +1,15 @@
+from app import create_app
+
+def test_sitemap_links(client):
+    links = client.get("/sitemap.json").json["links"]
+    assert links.count("/admin/") == 1
+    assert [link for link in links if link.startswith("/admin") and link != "/admin/"] == []
+    assert {"/drink", "/orders", "/user", "/sitemap.json"} <= set(links)
+    assert len(links) == len(set(links))
+
+def test_sitemap_without_admin(monkeypatch):
+    monkeypatch.setenv("JOB_WORKERS", "0")
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite://", "ADMIN_ENABLED": False})
+    sitemap = app.test_client().get("/sitemap.json").json
+    assert not [link for link in sitemap["links"] if link.startswith("/admin")]
+    assert not [route for route in sitemap["routes"] if route["path"].startswith("/admin")]
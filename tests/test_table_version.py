@@ -0,0 +1,32 @@
+from models import db, Drink, TableVersion
+
+def versions():
+    return {name: row.version for name, row in TableVersion.current(["drink", "order", "user"]).items()}
+
+def test_versions_go_up_after_the_commit(app, statements):
+    with app.app_context():
+        assert versions() == {} #db.create_all() seeds no rows
+        statements.clear()
+        db.session.add(Drink(name="cola", price=1.5))
+        db.session.flush()
+        assert not [sql for sql in statements if "table_version" in sql] #no lock on the version row during the write
+        db.session.commit()
+        assert versions() == {"drink": 1}
+        Drink.query.one().price = 2
+        db.session.commit()
+        assert versions() == {"drink": 2}
+
+def test_rolled_back_writes_do_not_bump(app):
+    with app.app_context():
+        db.session.add(Drink(name="cola", price=1.5))
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+        assert versions() == {}
+
+def test_concurrent_first_bumps_do_not_collide(app):
+    with app.app_context():
+        with db.engine.begin() as connection: #both see no row, the upsert adds up instead of failing on the insert
+            TableVersion.bump({"order"}, connection)
+            TableVersion.bump({"order", "user"}, connection)
+        assert versions() == {"order": 2, "user": 1}